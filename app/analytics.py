@@ -0,0 +1,167 @@
+"""Per-session statistics computed from a `Track`'s columns.
+
+Everything works on whole columns at once (`map`, `accumulate`, `bisect`
+over the packed arrays) instead of a Python loop per fix, so the stats of
+every session in a multi-year log are cheap to compute. Results are
+memoized in the session record by `session_stats`.
+
+Units: metres, seconds, km/h; pace is seconds per km.
+"""
+
+from bisect import bisect_left
+from collections import namedtuple
+from itertools import accumulate, groupby, islice
+from math import asin, cos, radians, sin, sqrt
+
+from perf import PERF
+
+EARTH_RADIUS = 6371008.8
+# Fixes slower than this (km/h) count as standing still
+STOP_SPEED = 2.0
+# Pauses shorter than this (s) are not reported as stops
+MIN_STOP = 20
+# Longer gaps between fixes (s) are signal loss, not moving time
+MAX_GAP = 30
+
+
+class SessionStats(namedtuple(
+        "SessionStats",
+        "fixes distance elapsed moving_time avg_speed max_speed pace splits stops")):
+    """Summary of one session.
+
+    `splits` holds the moving time of every full kilometre, `stops` holds
+    `(start, end, seconds)` fix ranges where the runner stood still for at
+    least `MIN_STOP` seconds. `pace` is None when no distance was covered.
+    """
+    __slots__ = ()
+
+
+def segment_lengths(lats, lons):
+    """Haversine length in metres of each step between consecutive fixes."""
+    phi = list(map(radians, lats))
+    lam = list(map(radians, lons))
+    cos_phi = list(map(cos, phi))
+    return [
+        2.0 * EARTH_RADIUS * asin(sqrt(
+            sin((p1 - p0) * 0.5) ** 2 + c0 * c1 * sin((l1 - l0) * 0.5) ** 2
+        ))
+        for p0, p1, c0, c1, l0, l1 in zip(phi, islice(phi, 1, None),
+                                          cos_phi, islice(cos_phi, 1, None),
+                                          lam, islice(lam, 1, None))
+    ]
+
+
+def segment_durations(seconds):
+    """Seconds between consecutive fixes; 0 if unknown or going backwards.
+
+    Track seconds already run on past midnight (see `Track.append_fix`).
+    """
+    return [
+        max(t1 - t0, 0) if t0 >= 0 and t1 >= 0 else 0
+        for t0, t1 in zip(seconds, islice(seconds, 1, None))
+    ]
+
+
+def compute_stats(track):
+    """Compute the `SessionStats` of a track.
+
+    A step counts as moving when the fix's reported speed (or, for logs
+    without speed, the speed over the step) is at least `STOP_SPEED` and
+    the step is no longer than `MAX_GAP`. Distance and moving time only
+    include moving steps, so GPS jitter while standing still is ignored.
+    Stops are runs of slower steps; longer gaps are lost signal instead.
+    """
+    n = len(track)
+    speeds = track.speed
+    if n < 2:
+        top = float(max(speeds)) if n else 0.0
+        return SessionStats(n, 0.0, 0, 0, 0.0, top, None, (), ())
+
+    lengths = segment_lengths(track.lat, track.lon)
+    durations = segment_durations(track.seconds)
+
+    if any(speeds):
+        fast = [v >= STOP_SPEED for v in islice(speeds, 1, None)]
+        max_speed = float(max(speeds))
+    else:
+        limit = STOP_SPEED / 3.6
+        fast = [d >= limit * dt for d, dt in zip(lengths, durations)]
+        max_speed = max((d / dt * 3.6 for d, dt in zip(lengths, durations) if dt), default=0.0)
+    # Steps of unknown or too long a duration are neither moving nor stopped
+    timed = [0 < dt <= MAX_GAP for dt in durations]
+    moving = [t and f for t, f in zip(timed, fast)]
+
+    moving_lengths = [d if m else 0.0 for d, m in zip(lengths, moving)]
+    moving_times = [dt if m else 0 for dt, m in zip(durations, moving)]
+    cum_distance = list(accumulate(moving_lengths))
+    cum_time = list(accumulate(moving_times))
+    cum_elapsed = list(accumulate(durations, initial=0))
+    distance = cum_distance[-1]
+    moving_time = cum_time[-1]
+
+    avg_speed = distance / moving_time * 3.6 if moving_time else 0.0
+    pace = moving_time / (distance / 1000.0) if distance else None
+
+    # Moving time at every full kilometre, interpolated within the step
+    marks = [0.0]
+    for km in range(1, int(distance // 1000.0) + 1):
+        target = km * 1000.0
+        i = bisect_left(cum_distance, target)
+        d0 = cum_distance[i - 1] if i else 0.0
+        t0 = cum_time[i - 1] if i else 0
+        step = cum_distance[i] - d0
+        frac = (target - d0) / step if step else 0.0
+        marks.append(t0 + frac * (cum_time[i] - t0))
+    splits = tuple(b - a for a, b in zip(marks, marks[1:]))
+
+    # A signal-loss gap ends a stop instead of being one
+    stops = []
+    step = 0
+    for is_stopped, run in groupby(t and not f for t, f in zip(timed, fast)):
+        count = sum(1 for _ in run)
+        if is_stopped:
+            seconds = cum_elapsed[step + count] - cum_elapsed[step]
+            if seconds >= MIN_STOP:
+                stops.append((step, step + count, seconds))
+        step += count
+
+    return SessionStats(n, distance, cum_elapsed[-1], moving_time, avg_speed,
+                        max_speed, pace, splits, tuple(stops))
+
+
+def session_stats(session):
+    """Return the session's stats, computing them if needed.
+
+    Returns None while the session's fixes have not been loaded. The
+    result is kept in `session["stats"]` and recomputed only when the
+    number of fixes changed.
+    """
+    coords = session.get("coords")
+    if coords is None:
+        return None
+    stats = session.get("stats")
+    if stats is None or stats.fixes != len(coords):
+        with PERF.timer("analytics", fixes=len(coords)):
+            stats = compute_stats(coords)
+        session["stats"] = stats
+    return stats
+
+
+def format_duration(seconds):
+    """`1:02:03` or `31:12`."""
+    m, s = divmod(int(round(seconds)), 60)
+    h, m = divmod(m, 60)
+    return f"{h}:{m:02d}:{s:02d}" if h else f"{m}:{s:02d}"
+
+
+def format_pace(pace):
+    """`5:58 /km`, or `-` without distance."""
+    if pace is None:
+        return "-"
+    return f"{format_duration(pace)} /km"
+
+
+def describe(stats):
+    """One-line `5.23 km, 31:12, 5:58 /km` description for the UI."""
+    return (f"{stats.distance / 1000.0:.2f} km, {format_duration(stats.moving_time)}, "
+            f"{format_pace(stats.pace)}")
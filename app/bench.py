@@ -0,0 +1,212 @@
+"""Headless benchmarks for the parsing and map geometry code.
+
+Runs without Kivy or a window, on logs written by `loggen`:
+
+    python bench.py                     # compare against bench_baseline.json
+    python bench.py --update-baseline   # record a new baseline
+    python bench.py --json out.json     # also write the results
+
+Every metric is the best of `--repeat` runs. The exit status is 1 when any
+metric is worse than the baseline by more than `--tolerance`. Baselines
+are machine specific; record one on the machine that runs the comparison.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from analytics import compute_stats
+from geo import PointGrid, ProjectionCache, project, simplify_ranks
+from loggen import write_log
+from logparser import index_sessions, iter_sessions, load_coords
+from timeline import TimeIndex
+from track import Track
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+
+# name -> True if a larger value is better
+HIGHER_IS_BETTER = {
+    "parse_mb_per_s": True,
+    "parse_fixes_per_s": True,
+    "index_mb_per_s": True,
+    "load_coords_fixes_per_s": True,
+    "bytes_per_fix": False,
+    "projection_fixes_per_s": True,
+    "simplify_fixes_per_s": True,
+    "hit_index_fixes_per_s": True,
+    "hit_test_us": False,
+    "analytics_fixes_per_s": True,
+    "time_window_us": False,
+}
+
+
+def best_of(repeat, fn):
+    """Run `fn` `repeat` times and return the shortest duration."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_parsing(path, repeat):
+    size = os.path.getsize(path)
+    fixes = sum(len(s["coords"]) for s in iter_sessions(path))
+
+    parse = best_of(repeat, lambda: sum(1 for _ in iter_sessions(path)))
+    index = best_of(repeat, lambda: index_sessions(path))
+
+    def load_all():
+        for session in index_sessions(path):
+            load_coords(session)
+    load = best_of(repeat, load_all)
+
+    return {
+        "parse_mb_per_s": size / parse / 1e6,
+        "parse_fixes_per_s": fixes / parse,
+        "index_mb_per_s": size / index / 1e6,
+        "load_coords_fixes_per_s": fixes / load,
+    }
+
+
+def random_track(fixes, seed=0):
+    rng = random.Random(seed)
+    track = Track()
+    lat, lon = -31.42, -64.19
+    for i in range(fixes):
+        lat += rng.uniform(-3e-5, 3e-5)
+        lon += rng.uniform(-3e-5, 3e-5)
+        track.append(lat, lon, rng.uniform(0.0, 15.0), i)
+    return track
+
+
+def bench_memory(fixes):
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        track = random_track(fixes)
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    grown = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    return {"bytes_per_fix": grown / len(track)}
+
+
+def bench_geometry(fixes, repeat, taps=2000):
+    track = random_track(fixes)
+
+    projection = best_of(repeat, lambda: project(track.lat, track.lon, 20))
+    xs, ys = project(track.lat, track.lon, 20)
+    simplify = best_of(repeat, lambda: simplify_ranks(xs, ys))
+    analytics = best_of(repeat, lambda: compute_stats(track))
+
+    cache = ProjectionCache(track)
+    _, _, lxs, lys = cache.get(16)
+    grid_build = best_of(repeat, lambda: PointGrid(lxs, lys, 15, 1, len(lxs) - 1))
+
+    grid = PointGrid(lxs, lys, 15, 1, len(lxs) - 1)
+    rng = random.Random(1)
+    x0, x1 = min(lxs), max(lxs)
+    y0, y1 = min(lys), max(lys)
+    queries = [(rng.uniform(x0, x1), rng.uniform(y0, y1)) for _ in range(taps)]
+
+    def tap_all():
+        for x, y in queries:
+            grid.nearest(x, y, 15)
+    hit = best_of(repeat, tap_all)
+
+    timeline = TimeIndex(track)
+    starts = [rng.randrange(fixes) for _ in range(taps)]
+
+    def scrub_all():
+        for t in starts:
+            timeline.stats(t - 60, t + 60)
+    scrub = best_of(repeat, scrub_all)
+
+    return {
+        "projection_fixes_per_s": fixes / projection,
+        "simplify_fixes_per_s": fixes / simplify,
+        "hit_index_fixes_per_s": fixes / grid_build,
+        "hit_test_us": hit / taps * 1e6,
+        "analytics_fixes_per_s": fixes / analytics,
+        "time_window_us": scrub / taps * 1e6,
+    }
+
+
+def run(sessions, fixes, geometry_fixes, repeat):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.txt")
+        write_log(path, sessions, fixes, noise=2.0, malformed=0.001)
+        results.update(bench_parsing(path, repeat))
+    results.update(bench_memory(geometry_fixes))
+    results.update(bench_geometry(geometry_fixes, repeat))
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Print a comparison table and return the names of regressed metrics."""
+    regressions = []
+    for name, value in results.items():
+        base = baseline.get(name)
+        if base is None or base == 0:
+            print(f"{name:28s} {value:14.2f}")
+            continue
+        change = (value - base) / base
+        worse = -change if HIGHER_IS_BETTER[name] else change
+        flag = ""
+        if worse > tolerance:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:28s} {value:14.2f}  baseline {base:14.2f}  {change:+7.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--fixes", type=int, default=3600, help="fixes per session")
+    parser.add_argument("--geometry-fixes", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed relative slowdown before failing")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    results = run(args.sessions, args.fixes, args.geometry_fixes, args.repeat)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(results, fh, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as fh:
+            json.dump(results, fh, indent=2)
+        compare(results, {}, args.tolerance)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    try:
+        with open(args.baseline, encoding="utf-8") as fh:
+            baseline = json.load(fh)
+    except FileNotFoundError:
+        baseline = {}
+        print(f"No baseline at {args.baseline}; run with --update-baseline")
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"{len(regressions)} metric(s) regressed: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+"""Import several logs at once into one session catalog.
+
+Logs collected from different devices (or copied twice off the same SD
+card) often contain the same session. `import_logs` parses every file in
+a process pool, one file per task, then merges the results: sessions with
+the same date, time and first fix are kept once, and the catalog is
+ordered by start time.
+"""
+
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from analytics import session_stats
+from logparser import iter_sessions, session_start
+from perf import PERF
+
+LOG_EXTENSION = ".txt"
+
+
+def find_logs(paths):
+    """Expand files and directories into a sorted list of log files."""
+    found = {}
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in files:
+                    if name.lower().endswith(LOG_EXTENSION):
+                        full = os.path.join(root, name)
+                        found.setdefault(os.path.realpath(full), full)
+        elif path.lower().endswith(LOG_EXTENSION) and os.path.isfile(path):
+            found.setdefault(os.path.realpath(path), path)
+    return sorted(found.values())
+
+
+def parse_log(path, cache=None):
+    """Worker task: return every session of one log, with its stats.
+
+    Runs in a pool process, so everything it returns is pickled back to
+    the parent; `Track` columns travel as raw array buffers.
+    """
+    sessions = cache.load(path) if cache is not None else None
+    if sessions is None:
+        identity = cache.identity(path) if cache is not None else None
+        sessions = list(iter_sessions(path))
+        if cache is not None:
+            cache.store(path, sessions, identity)
+    for session in sessions:
+        session_stats(session)
+    return sessions
+
+
+def session_key(session):
+    """Identity of a session across files: date, time and first fix."""
+    coords = session["coords"]
+    first = coords[0] if len(coords) else None
+    return session.get("date"), session.get("time"), first
+
+
+def _sort_key(session):
+    # The header time is local and the date UTC: order by the UTC start
+    start = session_start(session)
+    return start is None, start.timestamp() if start is not None else 0
+
+
+def merge_sessions(groups):
+    """Merge lists of sessions, dropping duplicates and sorting by start.
+
+    Returns `(sessions, duplicates)`. Of duplicated sessions the first one
+    seen is kept; sessions without a date and time go last.
+    """
+    seen = set()
+    merged = []
+    duplicates = 0
+    for sessions in groups:
+        for session in sessions:
+            key = session_key(session)
+            if key in seen:
+                duplicates += 1
+                continue
+            seen.add(key)
+            merged.append(session)
+    merged.sort(key=_sort_key)
+    return merged, duplicates
+
+
+def import_logs(paths, cache=None, workers=None, progress=None, cancel=None):
+    """Parse `paths` in parallel and return `(sessions, duplicates)`.
+
+    `workers` defaults to one process per core. If given,
+    `progress(files_done, bytes_done)` is called as files finish, and the
+    import stops early (returning what was merged so far) once the
+    `cancel` event is set. Files that fail to parse are reported and
+    skipped.
+    """
+    sizes = {path: os.path.getsize(path) for path in paths}
+    results = {}
+    bytes_done = 0
+
+    with PERF.timer("batch_import", bytes=sum(sizes.values()), files=len(paths)):
+        pool = ProcessPoolExecutor(max_workers=workers)
+        cancelled = False
+        try:
+            pending = {pool.submit(parse_log, path, cache): path for path in paths}
+            while pending:
+                done, _ = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+                if cancel is not None and cancel.is_set():
+                    cancelled = True
+                    break
+                for future in done:
+                    path = pending.pop(future)
+                    try:
+                        results[path] = future.result()
+                    except Exception as e:
+                        print(f"Error parsing {path}: {e}")
+                    bytes_done += sizes[path]
+                    if progress is not None:
+                        progress(len(paths) - len(pending), bytes_done)
+        finally:
+            # On cancel, return at once; files already being parsed finish
+            # in the background and their results are dropped
+            pool.shutdown(wait=not cancelled, cancel_futures=cancelled)
+
+    # Merge in path order so the result does not depend on scheduling
+    return merge_sessions(results[path] for path in paths if path in results)
@@ -0,0 +1,285 @@
+"""Headless export of logs to GPX, GeoJSON or a binary columnar format.
+
+Needs neither Kivy nor a display, so it can run in nightly jobs:
+
+    python export.py LOG.TXT -f gpx                  # writes LOG.gpx next to it
+    python export.py logs/ -f geojson -o out/ -j 4   # every log under logs/
+    python export.py LOG.TXT -f bin -o - > log.rctk  # to stdout
+
+Logs are streamed: only the session being converted is in memory, and it
+is written out before the next one is read. Several logs are converted in
+parallel, one per process.
+
+The binary format is a small header (magic "RCTK", version, byte order)
+followed by sessions in the log cache's layout (see `logcache`): date,
+time and summary strings, the fix count, then the raw lat/lon (float64),
+speed (float32) and seconds (int32) columns. `read_binary` reads it back.
+"""
+
+import argparse
+import json
+import os
+import struct
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from xml.sax.saxutils import escape
+
+from analytics import compute_stats
+from catalog import find_logs
+from logcache import read_session, write_session
+from logparser import iter_sessions, session_start
+from track import DAY, HALF_DAY
+
+MAGIC = b"RCTK"
+VERSION = 2
+_HEADER = struct.Struct("<4sHB")
+_BYTEORDER = 0 if sys.byteorder == "little" else 1
+# Fixes formatted per write call
+WRITE_BATCH = 4096
+
+
+def fix_times(session):
+    """Yield the UTC datetime of every fix, or None where it is unknown.
+
+    Fix seconds count from midnight of the session's first day (see
+    `Track.append_fix`); that day comes from the header.
+    """
+    start = session_start(session)
+    seconds = session["coords"].seconds
+    if start is None:
+        for _ in seconds:
+            yield None
+        return
+
+    day = start.replace(hour=0, minute=0, second=0)
+    start_sod = start.hour * 3600 + start.minute * 60 + start.second
+    first = next((s for s in seconds if s >= 0), None)
+    # The first fix can fall on the other side of midnight
+    if first is not None:
+        if first % DAY < start_sod - HALF_DAY:
+            day += timedelta(days=1)
+        elif first % DAY > start_sod + HALF_DAY:
+            day -= timedelta(days=1)
+    for s in seconds:
+        yield day + timedelta(seconds=s) if s >= 0 else None
+
+
+def _iso(moment):
+    return moment.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class GPXWriter:
+    """One `<trk>` per session."""
+    extension = ".gpx"
+    binary = False
+
+    def __init__(self, fh):
+        self.fh = fh
+        fh.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                 '<gpx version="1.1" creator="Running Companion" '
+                 'xmlns="http://www.topografix.com/GPX/1/1">\n')
+
+    def write(self, session):
+        fh = self.fh
+        name = f"{session.get('date') or '?'} {session.get('time') or '?'}"
+        fh.write(f"<trk><name>{escape(name)}</name>")
+        if session.get("summary"):
+            fh.write(f"<desc>{escape(session['summary'])}</desc>")
+        fh.write("<trkseg>\n")
+
+        coords = session["coords"]
+        batch = []
+        for lat, lon, moment in zip(coords.lat, coords.lon, fix_times(session)):
+            if moment is None:
+                batch.append(f'<trkpt lat="{lat:.5f}" lon="{lon:.5f}"/>\n')
+            else:
+                batch.append(f'<trkpt lat="{lat:.5f}" lon="{lon:.5f}"><time>{_iso(moment)}</time></trkpt>\n')
+            if len(batch) == WRITE_BATCH:
+                fh.write("".join(batch))
+                batch = []
+        fh.write("".join(batch))
+        fh.write("</trkseg></trk>\n")
+
+    def close(self):
+        self.fh.write("</gpx>\n")
+
+
+class GeoJSONWriter:
+    """A FeatureCollection with one LineString feature per session."""
+    extension = ".geojson"
+    binary = False
+
+    def __init__(self, fh):
+        self.fh = fh
+        self.count = 0
+        fh.write('{"type": "FeatureCollection", "features": [\n')
+
+    def write(self, session):
+        fh = self.fh
+        coords = session["coords"]
+        stats = compute_stats(coords)
+        properties = {
+            "date": session.get("date"),
+            "time": session.get("time"),
+            "summary": session.get("summary"),
+            "start": _iso(start) if (start := session_start(session)) else None,
+            "fixes": len(coords),
+            "distance_m": round(stats.distance, 1),
+            "moving_time_s": stats.moving_time,
+            "avg_speed_kmh": round(stats.avg_speed, 2),
+            "max_speed_kmh": round(stats.max_speed, 2),
+        }
+        if self.count:
+            fh.write(",\n")
+        self.count += 1
+        fh.write('{"type": "Feature", "properties": ')
+        fh.write(json.dumps(properties))
+        fh.write(', "geometry": {"type": "LineString", "coordinates": [')
+
+        for start in range(0, len(coords), WRITE_BATCH):
+            stop = min(start + WRITE_BATCH, len(coords))
+            part = ",".join(
+                f"[{coords.lon[i]:.5f},{coords.lat[i]:.5f}]" for i in range(start, stop)
+            )
+            fh.write("," + part if start else part)
+        fh.write("]}}")
+
+    def close(self):
+        self.fh.write("\n]}\n")
+
+
+class BinaryWriter:
+    """The compact columnar format described in the module docstring."""
+    extension = ".rctk"
+    binary = True
+
+    def __init__(self, fh):
+        self.fh = fh
+        fh.write(_HEADER.pack(MAGIC, VERSION, _BYTEORDER))
+
+    def write(self, session):
+        write_session(self.fh, session)
+
+    def close(self):
+        self.fh.flush()
+
+
+WRITERS = {"gpx": GPXWriter, "geojson": GeoJSONWriter, "bin": BinaryWriter}
+
+
+def read_binary(path):
+    """Yield the sessions of a file written by `BinaryWriter`."""
+    with open(path, "rb") as fh:
+        magic, version, byteorder = _HEADER.unpack(fh.read(_HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a Running Companion export")
+        if byteorder != _BYTEORDER:
+            raise ValueError(f"{path} was written with a different byte order")
+        while fh.peek(1):
+            yield read_session(fh)
+
+
+def export_stream(log_path, fh, fmt):
+    """Convert one log into an open file; return `(sessions, fixes)`."""
+    writer = WRITERS[fmt](fh)
+    sessions = fixes = 0
+    for session in iter_sessions(log_path):
+        writer.write(session)
+        sessions += 1
+        fixes += len(session["coords"])
+    writer.close()
+    return sessions, fixes
+
+
+def export_log(log_path, out_path, fmt):
+    """Convert one log into `out_path`, written atomically."""
+    tmp = out_path + ".tmp"
+    if WRITERS[fmt].binary:
+        fh = open(tmp, "wb")
+    else:
+        fh = open(tmp, "w", encoding="utf-8", newline="\n")
+    try:
+        with fh:
+            counts = export_stream(log_path, fh, fmt)
+        os.replace(tmp, out_path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    return counts
+
+
+def output_paths(logs, out_dir, fmt):
+    """Output file for each log; clashing names get a numeric suffix."""
+    extension = WRITERS[fmt].extension
+    taken = set()
+    paths = []
+    for log in logs:
+        directory = out_dir if out_dir is not None else os.path.dirname(log)
+        stem = os.path.splitext(os.path.basename(log))[0]
+        candidate = os.path.join(directory, stem + extension)
+        n = 1
+        while candidate in taken:
+            n += 1
+            candidate = os.path.join(directory, f"{stem}-{n}{extension}")
+        taken.add(candidate)
+        paths.append(candidate)
+    return paths
+
+
+def export_logs(logs, out_dir, fmt, jobs=None):
+    """Convert `logs` in a process pool; yield `(log, out, result)` in order.
+
+    `result` is `(sessions, fixes)`, or the exception raised.
+    """
+    outputs = output_paths(logs, out_dir, fmt)
+    if out_dir is not None:
+        os.makedirs(out_dir, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [(log, out, pool.submit(export_log, log, out, fmt))
+                   for log, out in zip(logs, outputs)]
+        for log, out, future in futures:
+            try:
+                yield log, out, future.result()
+            except Exception as e:
+                yield log, out, e
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("inputs", nargs="+", help="log files or directories of logs")
+    parser.add_argument("-f", "--format", choices=sorted(WRITERS), default="gpx")
+    parser.add_argument("-o", "--output",
+                        help="output directory (default: next to each log), "
+                             "or - for stdout with a single log")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="parallel processes (default: one per core)")
+    args = parser.parse_args()
+
+    logs = find_logs(args.inputs)
+    if not logs:
+        parser.error("no .txt logs found")
+
+    if args.output == "-":
+        if len(logs) != 1:
+            parser.error("-o - takes a single log")
+        out = sys.stdout.buffer if WRITERS[args.format].binary else sys.stdout
+        export_stream(logs[0], out, args.format)
+        return 0
+
+    failed = 0
+    for log, out, result in export_logs(logs, args.output, args.format, args.jobs):
+        if isinstance(result, Exception):
+            failed += 1
+            print(f"{log}: {result}", file=sys.stderr)
+        else:
+            sessions, fixes = result
+            print(f"{log} -> {out}: {sessions} sessions, {fixes} fixes")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,321 @@
+"""Web Mercator helpers for drawing tracks on a kivy_garden.mapview map.
+
+World pixels use the same convention as `MapSource.get_x/get_y`: x grows
+eastwards, y grows northwards, and the world is `tile_size * 2**zoom`
+pixels wide.
+"""
+
+from array import array
+from collections import OrderedDict
+from math import cos, inf, log, pi, radians, sqrt, tan
+
+from perf import PERF
+
+MAX_LATITUDE = 85.0511287798
+TILE_SIZE = 256
+# Zoom at which tracks are projected; mapview tops out at 19
+REF_ZOOM = 20
+# Fixes appended to a growing track before its tail is simplified again
+RERANK_FIXES = 64
+
+
+def world_size(zoom, tile_size=TILE_SIZE):
+    return tile_size * 2.0 ** zoom
+
+
+def project(lats, lons, zoom, tile_size=TILE_SIZE):
+    """Project lat/lon columns to world-pixel `(xs, ys)` arrays at `zoom`."""
+    size = world_size(zoom, tile_size)
+    kx = size / 360.0
+    ky = size / (2.0 * pi)
+    xs = array("d", [(lon + 180.0) * kx for lon in lons])
+    rads = [radians(min(max(lat, -MAX_LATITUDE), MAX_LATITUDE)) for lat in lats]
+    ys = array("d", [(pi + log(tan(r) + 1.0 / cos(r))) * ky for r in rads])
+    return xs, ys
+
+
+def simplify_ranks(xs, ys):
+    """Douglas-Peucker significance of every vertex of a polyline.
+
+    A vertex survives simplification with tolerance `t` exactly when its
+    rank is greater than `t`, so one pass gives every level of detail.
+    Ranks are clamped to their parent's so the levels nest; endpoints are
+    always kept.
+    """
+    n = len(xs)
+    ranks = array("d", bytes(8 * n))
+    if n == 0:
+        return ranks
+    ranks[0] = ranks[n - 1] = inf
+
+    stack = [(0, n - 1, inf)]
+    while stack:
+        a, b, limit = stack.pop()
+        if b - a < 2:
+            continue
+
+        ax, ay = xs[a], ys[a]
+        dx, dy = xs[b] - ax, ys[b] - ay
+        seg2 = dx * dx + dy * dy
+        best, index = -1.0, a + 1
+        for i in range(a + 1, b):
+            px, py = xs[i] - ax, ys[i] - ay
+            if seg2 > 0.0:
+                t = (px * dx + py * dy) / seg2
+                if t < 0.0:
+                    t = 0.0
+                elif t > 1.0:
+                    t = 1.0
+                px -= t * dx
+                py -= t * dy
+            d = px * px + py * py
+            if d > best:
+                best, index = d, i
+
+        rank = min(sqrt(best), limit)
+        ranks[index] = rank
+        stack.append((a, index, rank))
+        stack.append((index, b, rank))
+    return ranks
+
+
+class ProjectionCache:
+    """World-pixel projections of a track, computed once per zoom level.
+
+    The track is projected with trigonometry only once, at `REF_ZOOM`;
+    other zooms are exact power-of-two rescales of it. `get(zoom)` returns
+    `(ox, oy, xs, ys)`: the world position of the first fix and every
+    fix's offset from it. Keeping the vertices relative to an origin keeps
+    them small enough for float32 vertex buffers even at street-level
+    zooms; the origin is applied as a translation when drawing.
+
+    With a `tolerance` (in world pixels at `zoom`) only the vertices of
+    the Douglas-Peucker simplification at that tolerance are returned.
+
+    If the track grows (live follow), the next `get` projects only the new
+    fixes and appends them to the cached arrays in place. The new part is
+    simplified on its own, keeping the old last vertex. Once `RERANK_FIXES`
+    fixes were appended that way, the whole tail since the last re-rank is
+    simplified again, so the endpoints of earlier appends can drop out,
+    and so is the whole track each time it doubled. The simplified levels
+    are then rebuilt rather than appended to, and `revision` goes up.
+    Results may still differ slightly from simplifying the whole track at
+    once.
+    """
+
+    def __init__(self, track, tile_size=TILE_SIZE, max_zooms=8):
+        self.track = track
+        self.tile_size = tile_size
+        self.max_zooms = max_zooms
+        self._reference = None
+        self._ranks = None
+        # Last vertex when the tail was last simplified, and the number of
+        # fixes when the whole track was
+        self._anchor = 0
+        self._simplified = 0
+        self._levels = OrderedDict()
+        self._indices = {}
+        self.revision = 0
+
+    @property
+    def reference(self):
+        if self._reference is not None and len(self._reference[0]) != len(self.track):
+            self._extend()
+        if self._reference is None:
+            with PERF.timer("projection", fixes=len(self.track)):
+                self._reference = project(self.track.lat, self.track.lon, REF_ZOOM, self.tile_size)
+        return self._reference
+
+    @property
+    def ranks(self):
+        if self._ranks is None:
+            reference = self.reference
+            with PERF.timer("simplify", fixes=len(self.track)):
+                self._ranks = simplify_ranks(*reference)
+            self._anchor = max(len(self._ranks) - 1, 0)
+            self._simplified = len(self._ranks)
+        return self._ranks
+
+    def _extend(self):
+        """Project the fixes appended to the track since the last call."""
+        ref_xs, ref_ys = self._reference
+        start = len(ref_xs)
+        if start == 0 or len(self.track) < start:
+            # Nothing to extend, or not an append; start over
+            self._reference = self._ranks = None
+            self._levels.clear()
+            self._indices.clear()
+            self.revision += 1
+            return
+
+        with PERF.timer("projection", fixes=len(self.track) - start):
+            xs, ys = project(self.track.lat[start:], self.track.lon[start:],
+                             REF_ZOOM, self.tile_size)
+        ref_xs.extend(xs)
+        ref_ys.extend(ys)
+
+        ranks = None
+        if self._ranks is not None and len(ref_xs) - 1 - self._anchor >= RERANK_FIXES:
+            # Simplify the tail since the last re-rank (or the whole track
+            # once it doubled) as a whole; the old endpoints in it may go,
+            # so drop the simplified levels
+            if len(ref_xs) >= 2 * self._simplified:
+                anchor = 0
+                self._simplified = len(ref_xs)
+            else:
+                anchor = self._anchor
+            with PERF.timer("simplify", fixes=len(ref_xs) - anchor):
+                ranks = simplify_ranks(ref_xs[anchor:], ref_ys[anchor:])
+            del self._ranks[anchor:]
+            self._ranks.extend(ranks)
+            self._anchor = len(ref_xs) - 1
+            for key in [key for key in self._levels if key[1] is not None]:
+                del self._levels[key]
+                self._indices.pop(key, None)
+            self.revision += 1
+        elif self._ranks is not None:
+            # Simplify from the old last vertex on; it stays an endpoint
+            with PERF.timer("simplify", fixes=len(xs)):
+                ranks = simplify_ranks(ref_xs[start - 1:], ref_ys[start - 1:])
+            self._ranks.extend(ranks[1:])
+
+        for (zoom, tolerance), (ox, oy, lxs, lys) in self._levels.items():
+            f = 2.0 ** (zoom - REF_ZOOM)
+            if tolerance is None:
+                new = range(start, len(ref_xs))
+            else:
+                threshold = tolerance * 2.0 ** (REF_ZOOM - zoom)
+                new = [start + i for i, r in enumerate(ranks[1:]) if r > threshold]
+                self._indices[(zoom, tolerance)].extend(new)
+            lxs.extend([ref_xs[i] * f - ox for i in new])
+            lys.extend([ref_ys[i] * f - oy for i in new])
+
+    def lod_indices(self, zoom, tolerance):
+        """Indices of the vertices kept at `tolerance` pixels at `zoom`."""
+        threshold = tolerance * 2.0 ** (REF_ZOOM - zoom)
+        return array("i", [i for i, r in enumerate(self.ranks) if r > threshold])
+
+    def source_indices(self, zoom, tolerance=None):
+        """Track index of each vertex of `get(zoom, tolerance)`; None if all are kept."""
+        if tolerance is None:
+            return None
+        self.get(zoom, tolerance)
+        return self._indices[(zoom, tolerance)]
+
+    def get(self, zoom, tolerance=None):
+        ref_xs, ref_ys = self.reference
+        key = (zoom, tolerance)
+        level = self._levels.get(key)
+        if level is not None:
+            self._levels.move_to_end(key)
+            return level
+
+        f = 2.0 ** (zoom - REF_ZOOM)
+        if tolerance is not None:
+            indices = self._indices[key] = self.lod_indices(zoom, tolerance)
+            ref_xs = [ref_xs[i] for i in indices]
+            ref_ys = [ref_ys[i] for i in indices]
+
+        with PERF.timer("projection.zoom", fixes=len(ref_xs)):
+            ox = ref_xs[0] * f if ref_xs else 0.0
+            oy = ref_ys[0] * f if ref_ys else 0.0
+            level = (
+                ox, oy,
+                array("d", [x * f - ox for x in ref_xs]),
+                array("d", [y * f - oy for y in ref_ys])
+            )
+        self._levels[key] = level
+        if len(self._levels) > self.max_zooms:
+            old, _ = self._levels.popitem(last=False)
+            self._indices.pop(old, None)
+        return level
+
+
+class PointGrid:
+    """Uniform grid over projected points for nearest-point queries.
+
+    Build it over the projection at the zoom being displayed; a query
+    only looks at the cells within `radius` of the query point.
+    """
+
+    def __init__(self, xs, ys, cell, start=0, stop=None):
+        self.xs = xs
+        self.ys = ys
+        self.cell = cell
+        self.cells = {}
+        self.add(start, len(xs) if stop is None else stop)
+
+    def add(self, start, stop):
+        """Add the points `start` to `stop` (exclusive), e.g. after an append."""
+        xs, ys, cell = self.xs, self.ys, self.cell
+        for i in range(start, stop):
+            key = (int(xs[i] // cell), int(ys[i] // cell))
+            bucket = self.cells.get(key)
+            if bucket is None:
+                self.cells[key] = [i]
+            else:
+                bucket.append(i)
+
+    def nearest(self, x, y, radius):
+        """Return the index of the closest point within `radius`, or -1."""
+        cell = self.cell
+        x0, x1 = int((x - radius) // cell), int((x + radius) // cell)
+        y0, y1 = int((y - radius) // cell), int((y + radius) // cell)
+        best, best_d = -1, radius * radius
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                for i in self.cells.get((cx, cy), ()):
+                    dx = self.xs[i] - x
+                    dy = self.ys[i] - y
+                    d = dx * dx + dy * dy
+                    if d <= best_d:
+                        best, best_d = i, d
+        return best
+
+
+class SegmentIndex:
+    """Bounding boxes over fixed-size chunks of a polyline.
+
+    Chunk `k` covers vertices `k * chunk` to `(k + 1) * chunk` inclusive,
+    so neighbouring chunks share a vertex and every segment lies inside
+    its chunk's box. `query` merges the chunks intersecting a rectangle
+    into runs of consecutive vertices that can each be drawn as one line.
+    """
+
+    def __init__(self, xs, ys, chunk=128):
+        self.chunk = chunk
+        self.count = 0
+        self.boxes = []
+        self.extend(xs, ys)
+
+    def extend(self, xs, ys):
+        """Index the vertices appended to `xs`/`ys` since the last call.
+
+        Only the last, partial chunk is recomputed along with the new ones.
+        """
+        count = len(xs)
+        if count <= self.count:
+            return
+        first = len(self.boxes) - 1 if self.boxes else 0
+        del self.boxes[first:]
+        self.count = count
+        for start in range(first * self.chunk, max(count - 1, 1), self.chunk):
+            stop = min(start + self.chunk, count - 1) + 1
+            cx = xs[start:stop]
+            cy = ys[start:stop]
+            self.boxes.append((min(cx), min(cy), max(cx), max(cy)))
+
+    def query(self, x0, y0, x1, y1):
+        """Return `(start, stop)` vertex ranges (stop exclusive) in the box."""
+        runs = []
+        chunk = self.chunk
+        for k, (bx0, by0, bx1, by1) in enumerate(self.boxes):
+            if bx1 < x0 or bx0 > x1 or by1 < y0 or by0 > y1:
+                continue
+            start = k * chunk
+            stop = min(start + chunk, self.count - 1) + 1
+            if runs and runs[-1][1] - 1 == start:
+                runs[-1] = (runs[-1][0], stop)
+            else:
+                runs.append((start, stop))
+        return runs
@@ -0,0 +1,173 @@
+"""Log imports running on a worker thread, independent of the UI.
+
+`LogImport` reads one log (from the cache, as a lazy index or fully
+parsed) and `BatchImport` several logs in a process pool. Both report
+through callbacks, so the same code drives the Kivy app and headless
+tools.
+"""
+
+import os
+import threading
+
+from analytics import session_stats
+from catalog import find_logs, import_logs
+from logparser import index_sessions, iter_sessions, load_coords
+
+
+class ImportCancelled(Exception):
+    """Raised inside the worker thread to abandon a cancelled import."""
+
+
+class LogImport:
+    """Parses a log file on a worker thread.
+
+    Callbacks are invoked through `dispatch(callback, *args)`, which by
+    default calls them right away on the worker thread; the app passes one
+    that hands them to the Kivy main thread. The callbacks are:
+    `on_progress(bytes_read, total_bytes, session_count)`,
+    `on_session(session)` for every parsed session and finally
+    `on_done(sessions, cancelled)`. Sessions arrive with their stats
+    (see `analytics.session_stats`) already computed.
+
+    With `lazy=True` the log is only indexed (see `index_sessions`), so
+    `on_done` fires as soon as the session boundaries are known. The
+    worker then keeps parsing the fixes in the background to compute the
+    stats and fill the cache, unless cancelled, and calls
+    `on_stats(sessions)` once done; sessions opened before that are
+    parsed on demand by `load_coords`.
+    """
+
+    def __init__(self, path, on_progress=None, on_session=None, on_done=None,
+                 cache=None, lazy=False, dispatch=None):
+        self.path = path
+        self.dispatch = dispatch
+        self.cache = cache
+        self.lazy = lazy
+        self.on_progress = on_progress
+        self.on_session = on_session
+        self.on_done = on_done
+        self.on_stats = None
+        self.total_bytes = 0
+        # Log identity for the cache entry, taken before reading
+        self.identity = None
+        self.sessions = []
+        self._cancel = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def _dispatch(self, callback, *args):
+        if callback is None:
+            return
+        if self.dispatch is None:
+            callback(*args)
+        else:
+            self.dispatch(callback, *args)
+
+    def _progress(self, bytes_read):
+        if self._cancel.is_set():
+            raise ImportCancelled()
+        self._dispatch(self.on_progress, bytes_read, self.total_bytes, len(self.sessions))
+
+    def _add_session(self, session):
+        session_stats(session)
+        self.sessions.append(session)
+        self._dispatch(self.on_session, session)
+        if self._cancel.is_set():
+            raise ImportCancelled()
+
+    def _run(self):
+        warm = False
+        try:
+            self.total_bytes = os.path.getsize(self.path)
+            cached = self.cache.load(self.path) if self.cache is not None else None
+            self.identity = self.cache.identity(self.path) if self.cache is not None else None
+            if cached is not None:
+                print(f"Loaded {self.path} from cache")
+                for session in cached:
+                    self._add_session(session)
+            elif self.lazy:
+                for session in index_sessions(self.path):
+                    self._add_session(session)
+                self._progress(self.total_bytes)
+                warm = True
+            else:
+                for session in iter_sessions(self.path, progress=self._progress):
+                    self._add_session(session)
+                if self.cache is not None:
+                    self.cache.store(self.path, self.sessions, self.identity)
+        except ImportCancelled:
+            pass
+        except Exception as e:
+            print(f"Error parsing file: {e}")
+
+        print(f"Parsed {len(self.sessions)} sessions")
+        self._dispatch(self.on_done, self.sessions, self.cancelled)
+
+        if warm:
+            self._warm_cache()
+
+    def _warm_cache(self):
+        try:
+            for session in self.sessions:
+                if self._cancel.is_set():
+                    return
+                load_coords(session)
+                session_stats(session)
+            self._dispatch(self.on_stats, self.sessions)
+            if self.cache is not None:
+                self.cache.store(self.path, self.sessions, self.identity)
+        except Exception as e:
+            print(f"Error parsing file: {e}")
+
+
+class BatchImport(LogImport):
+    """Imports several logs, or directories of logs, in parallel.
+
+    The files are parsed in a process pool by `catalog.import_logs`. Once
+    all are done, the merged and de-duplicated catalog is delivered in
+    date order through `on_session`, then `on_done`. `on_progress`
+    fires as files finish; `files_done` and `files` tell how many.
+    """
+
+    def __init__(self, paths, on_progress=None, on_session=None, on_done=None,
+                 cache=None, workers=None, dispatch=None):
+        super().__init__(None, on_progress, on_session, on_done, cache, dispatch=dispatch)
+        self.paths = paths
+        self.workers = workers
+        self.files = []
+        self.files_done = 0
+        self.duplicates = 0
+
+    def _file_progress(self, files_done, bytes_done):
+        self.files_done = files_done
+        self._dispatch(self.on_progress, bytes_done, self.total_bytes, len(self.sessions))
+
+    def _run(self):
+        try:
+            self.files = find_logs(self.paths)
+            self.total_bytes = sum(os.path.getsize(path) for path in self.files)
+            sessions, self.duplicates = import_logs(
+                self.files, cache=self.cache, workers=self.workers,
+                progress=self._file_progress, cancel=self._cancel
+            )
+            if self.duplicates:
+                print(f"Skipped {self.duplicates} duplicate sessions")
+            for session in sessions:
+                self._add_session(session)
+        except ImportCancelled:
+            pass
+        except Exception as e:
+            print(f"Error importing logs: {e}")
+
+        print(f"Imported {len(self.sessions)} sessions from {len(self.files)} files")
+        self._dispatch(self.on_done, self.sessions, self.cancelled)
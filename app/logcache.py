@@ -0,0 +1,206 @@
+"""On-disk cache of parsed logs.
+
+Each log gets one entry file in `logcache/`, named after a hash of its
+absolute path. The entry header records the size, mtime and a content
+fingerprint of the log it was built from; if any of them no longer match
+(e.g. the device appended a session) the entry is treated as stale and is
+rebuilt on the next store.
+
+Entry layout (little header, then raw typed-array columns per session):
+
+    magic "RCLC", version, byteorder, log size, log mtime_ns,
+    fingerprint, session count
+    per session: date, time, summary (length-prefixed UTF-8),
+                 fix count, lat, lon, speed, seconds
+"""
+
+import hashlib
+import os
+import struct
+import sys
+from array import array
+
+from logparser import summary_text
+from track import Track
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logcache")
+MAX_CACHE_BYTES = 256 * 1024 * 1024
+
+MAGIC = b"RCLC"
+VERSION = 2
+FINGERPRINT_BLOCK = 64 * 1024
+
+_HEADER = struct.Struct("<4sHBqq20sI")
+_STRING_LEN = struct.Struct("<H")
+_COUNT = struct.Struct("<I")
+_NO_STRING = 0xFFFF
+_BYTEORDER = 0 if sys.byteorder == "little" else 1
+
+
+def fingerprint(path, size):
+    """Hash the size plus the first and last blocks of a file."""
+    digest = hashlib.sha1(str(size).encode())
+    with open(path, "rb") as fh:
+        digest.update(fh.read(FINGERPRINT_BLOCK))
+        if size > FINGERPRINT_BLOCK:
+            fh.seek(max(size - FINGERPRINT_BLOCK, FINGERPRINT_BLOCK))
+            digest.update(fh.read(FINGERPRINT_BLOCK))
+    return digest.digest()
+
+
+def _write_string(fh, value):
+    if value is None:
+        fh.write(_STRING_LEN.pack(_NO_STRING))
+        return
+    data = value.encode("utf-8")[:_NO_STRING - 1]
+    fh.write(_STRING_LEN.pack(len(data)))
+    fh.write(data)
+
+
+def _read_string(fh):
+    (length,) = _STRING_LEN.unpack(fh.read(_STRING_LEN.size))
+    if length == _NO_STRING:
+        return None
+    return fh.read(length).decode("utf-8")
+
+
+def _read_column(fh, typecode, count):
+    column = array(typecode)
+    column.frombytes(fh.read(count * column.itemsize))
+    if len(column) != count:
+        raise EOFError("truncated cache entry")
+    return column
+
+
+def write_session(fh, session):
+    """Write one session: strings, fix count, then the raw columns."""
+    _write_string(fh, session.get("date"))
+    _write_string(fh, session.get("time"))
+    _write_string(fh, session.get("summary"))
+    coords = session["coords"]
+    fh.write(_COUNT.pack(len(coords)))
+    for column in (coords.lat, coords.lon, coords.speed, coords.seconds):
+        fh.write(column)
+
+
+def read_session(fh):
+    """Read a session written by `write_session`."""
+    date = _read_string(fh)
+    time = _read_string(fh)
+    summary = _read_string(fh)
+    (n,) = _COUNT.unpack(fh.read(_COUNT.size))
+    coords = Track(
+        _read_column(fh, "d", n),
+        _read_column(fh, "d", n),
+        _read_column(fh, "f", n),
+        _read_column(fh, "i", n)
+    )
+    return {"date": date, "time": time, "coords": coords, "summary": summary,
+            "summary_text": summary_text(summary), "stats": None}
+
+
+class LogCache:
+    """Size-bounded cache of parsed sessions, keyed by log identity."""
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def entry_path(self, path):
+        key = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{key}.bin")
+
+    def identity(self, path):
+        """`(size, mtime_ns, fingerprint)` of the log as it is now.
+
+        Take it before reading the log and pass it to `store`, so an entry
+        never claims content that was appended after it was parsed.
+        """
+        st = os.stat(path)
+        return st.st_size, st.st_mtime_ns, fingerprint(path, st.st_size)
+
+    def load(self, path):
+        """Return the cached sessions for `path`, or None on a miss."""
+        entry = self.entry_path(path)
+        try:
+            st = os.stat(path)
+            size, mtime_ns = st.st_size, st.st_mtime_ns
+            with open(entry, "rb") as fh:
+                header = fh.read(_HEADER.size)
+                if len(header) != _HEADER.size:
+                    return None
+                magic, version, byteorder, c_size, c_mtime, c_print, count = _HEADER.unpack(header)
+                if (magic != MAGIC or version != VERSION or byteorder != _BYTEORDER
+                        or c_size != size or c_mtime != mtime_ns):
+                    return None
+                if c_print != fingerprint(path, size):
+                    return None
+
+                sessions = [read_session(fh) for _ in range(count)]
+        except (OSError, EOFError, struct.error, UnicodeDecodeError):
+            return None
+
+        # Mark as recently used for eviction
+        try:
+            os.utime(entry)
+        except OSError:
+            pass
+        return sessions
+
+    def store(self, path, sessions, identity):
+        """Write `sessions` as the cache entry for `path`.
+
+        `identity` is what `identity(path)` returned before the log was
+        read for these sessions.
+        """
+        entry = self.entry_path(path)
+        tmp = entry + ".tmp"
+        size, mtime_ns, fprint = identity
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp, "wb") as fh:
+                fh.write(_HEADER.pack(MAGIC, VERSION, _BYTEORDER, size, mtime_ns,
+                                      fprint, len(sessions)))
+                for session in sessions:
+                    write_session(fh, session)
+            os.replace(tmp, entry)
+        except OSError as e:
+            print(f"Could not write log cache: {e}")
+            return
+        self.evict()
+
+    def evict(self):
+        """Delete least recently used entries until under `max_bytes`."""
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+
+        entries = []
+        total = 0
+        for name in names:
+            if not name.endswith(".bin"):
+                continue
+            full = os.path.join(self.directory, name)
+            try:
+                st = os.stat(full)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, full))
+            total += st.st_size
+
+        entries.sort()
+        for _, size, full in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(full)
+                total -= size
+            except OSError:
+                pass
+
+    def clear(self):
+        """Remove every cache entry."""
+        max_bytes, self.max_bytes = self.max_bytes, -1
+        self.evict()
+        self.max_bytes = max_bytes
@@ -0,0 +1,104 @@
+"""Synthetic log generator in the exact format the firmware writes.
+
+Mirrors Core/Src/system_state.c (session header and summary) and
+gpsFormatBuffer in Core/Src/gps.c (one `HH:MM:SS,lat,lon,speed` line per
+fix), including the CRLF line endings. Like the firmware, the header
+pairs the UTC date of the GPS fix (lastUtcDate) with the local time
+(gpsConvertUtcToLocal), so sessions started between 21:00 and 24:00 local
+carry the next day's date; the first session of every log is one of them.
+
+
+    python loggen.py out.txt --sessions 20 --fixes 3600 --noise 0.2 --malformed 0.01
+"""
+
+import argparse
+import math
+import random
+
+from logparser import UTC_OFFSET
+
+# Córdoba, where the device was developed
+START_LAT = -31.4201
+START_LON = -64.1888
+
+_MALFORMED = (
+    "22:39",
+    "00:00:00,,,",
+    "12:34:56,-31.4x,-64.1, 2.0",
+    "$GPGGA,123519,,,,,0,00,,,M,,M,,*47",
+    ",,,",
+    "==",
+)
+
+
+def _hms(seconds):
+    seconds %= 86400
+    return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+def write_session(fh, rng, day, start, fixes, noise=0.0, malformed=0.0):
+    """Write one session block of `fixes` 1 Hz fixes starting at UTC `start`.
+
+    `day` picks the UTC date written in the header, next to the local time.
+    """
+    local = (start + UTC_OFFSET) % 86400
+    fh.write(
+        f"\r\n==== New Session ====\r\nDate: 2025-{1 + day // 28 % 12:02d}-{1 + day % 28:02d}"
+        f"\r\nTime: {_hms(local)}\r\n=====================\r\n"
+    )
+
+    lat = START_LAT + rng.uniform(-0.02, 0.02)
+    lon = START_LON + rng.uniform(-0.02, 0.02)
+    heading = rng.uniform(0, 2 * math.pi)
+    for i in range(fixes):
+        speed = max(0.0, rng.gauss(10.0, 2.0))
+        # One second at `speed` km/h, in degrees (~111 km per degree)
+        step = speed / 3600.0 / 111.0
+        heading += rng.gauss(0.0, 0.15)
+        lat += step * math.cos(heading)
+        lon += step * math.sin(heading) / math.cos(math.radians(lat))
+
+        out_lat, out_lon = lat, lon
+        if noise:
+            # GPS jitter, `noise` is the standard deviation in metres
+            out_lat += rng.gauss(0.0, noise) / 111000.0
+            out_lon += rng.gauss(0.0, noise) / 111000.0
+        fh.write(f"{_hms(start + i)},{out_lat:.5f},{out_lon:.5f},{speed:4.1f}\r\n")
+
+        if malformed and rng.random() < malformed:
+            fh.write(rng.choice(_MALFORMED) + "\r\n")
+
+    fh.write(
+        f"Session: {fixes // 3600:02d}:{fixes // 60 % 60:02d}:{fixes % 60:02d}, "
+        f"Steps: {int(fixes * 2.7)}\r\n\r\n"
+    )
+
+
+def write_log(path, sessions=10, fixes=3600, noise=0.0, malformed=0.0, seed=0):
+    """Write a log with `sessions` sessions of `fixes` fixes each."""
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8", newline="") as fh:
+        for day in range(sessions):
+            if day == 0:
+                # Late evening local time: the header date is already tomorrow's
+                start = rng.randrange(0, -UTC_OFFSET)
+            else:
+                start = rng.randrange(0, 86400)
+            write_session(fh, rng, day, start, fixes, noise, malformed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path")
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--fixes", type=int, default=3600, help="fixes per session")
+    parser.add_argument("--noise", type=float, default=0.0, help="GPS jitter in metres")
+    parser.add_argument("--malformed", type=float, default=0.0,
+                        help="probability of a garbage line after each fix")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    write_log(args.path, args.sessions, args.fixes, args.noise, args.malformed, args.seed)
+
+
+if __name__ == "__main__":
+    main()
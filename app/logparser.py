@@ -0,0 +1,317 @@
+"""Streaming parser for the Running Companion SD-card log format.
+
+The firmware (Core/Src/system_state.c) appends blocks like:
+
+    ==== New Session ====
+    Date: 2025-11-02
+    Time: 19:39:05
+    =====================
+    22:39:09,-31.45759,-64.16764, 2.0
+    ...
+    Session: 00:12:31, Steps: 1432
+"""
+
+import mmap
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from perf import PERF
+from track import DAY, Track, parse_hms
+
+SESSION_MARKER = "==== New Session ===="
+# The header Date is the UTC date of the fix (lastUtcDate) but its Time is
+# local time, UTC-3 (gpsConvertUtcToLocal); fix timestamps are UTC
+UTC_OFFSET = -3 * 3600
+PROGRESS_LINES = 4096
+HEADER_BYTES = 256
+
+_LOAD_LOCK = threading.Lock()
+
+
+def new_session():
+    """Return an empty session record."""
+    return {"date": None, "time": None, "coords": Track(), "summary": None,
+            "summary_text": "", "stats": None}
+
+
+def session_start(session):
+    """UTC start of a session from its Date/Time header, or None.
+
+    The firmware writes the UTC date next to the local time, so only the
+    time is shifted by UTC_OFFSET; the date is kept as it is.
+    """
+    try:
+        date = datetime.strptime(session["date"], "%Y-%m-%d")
+        local = datetime.strptime(session["time"], "%H:%M:%S")
+    except (TypeError, ValueError):
+        return None
+    seconds = (local.hour * 3600 + local.minute * 60 + local.second - UTC_OFFSET) % DAY
+    return (date + timedelta(seconds=seconds)).replace(tzinfo=timezone.utc)
+
+
+def summary_text(summary):
+    """Short `00:12:31, Steps: 1432` form of a summary line for the UI."""
+    if summary and "Steps:" in summary:
+        parts = summary.split(",")
+        if len(parts) >= 2:
+            return f"{parts[0].split(':', 1)[1].strip()}, {parts[1].strip()}"
+    return ""
+
+
+def parse_coord_line(line):
+    """Parse a coordinate line into `(lat, lon, speed, seconds)`, or None.
+
+    Handles both `22:39:09,-31.45759,-64.16764, 2.0` and the older
+    `22:39:09,-31.45759,-64.16764` format without speed.
+    """
+    parts = line.split(",")
+    if len(parts) < 3:  # At least timestamp, lat, lon
+        return None
+    try:
+        lat = float(parts[1])
+        lon = float(parts[2])
+        speed = float(parts[3]) if len(parts) >= 4 else 0.0
+    except ValueError:
+        return None
+    return lat, lon, speed, parse_hms(parts[0].strip())
+
+
+class SessionParser:
+    """Incremental form of the log format's state machine.
+
+    Lines go in one at a time (`feed_line`) or as arbitrary chunks of
+    bytes (`feed`), e.g. whatever was appended to a log since it was last
+    read; a line split across chunks is held back until it is complete.
+    `current` is the session being read. Pass an existing session to
+    continue it, e.g. the last one of a log that is still being written.
+    """
+
+    def __init__(self, session=None):
+        self.current = new_session() if session is None else session
+        self._partial = b""
+
+    def feed_line(self, line):
+        """Process one stripped line; return the session it completed, if any."""
+        if line.startswith(SESSION_MARKER):
+            done = self.current
+            self.current = new_session()
+            # Sessions without coordinates are skipped, as they were by
+            # the original parser
+            return done if done["coords"] else None
+
+        current = self.current
+        if line.startswith("Date:"):
+            current["date"] = line[5:].strip()
+
+        elif line.startswith("Time:"):
+            current["time"] = line[5:].strip()
+
+        elif line.startswith("Session:"):
+            current["summary"] = line
+            current["summary_text"] = summary_text(line)
+
+        else:
+            fix = parse_coord_line(line)
+            if fix is not None:
+                current["coords"].append_fix(*fix)
+        return None
+
+    def feed(self, data):
+        """Process a chunk of bytes; return the sessions it completed."""
+        lines = (self._partial + data).split(b"\n")
+        self._partial = lines.pop()
+        done = []
+        for raw in lines:
+            line = raw.decode("utf-8", "replace").strip()
+            if line:
+                session = self.feed_line(line)
+                if session is not None:
+                    done.append(session)
+        return done
+
+    def close(self):
+        """Flush a trailing unterminated line; return the last session, if any."""
+        if self._partial:
+            line = self._partial.decode("utf-8", "replace").strip()
+            self._partial = b""
+            if line:
+                self.feed_line(line)
+        return self.current if self.current["coords"] else None
+
+
+def iter_sessions(file_path, progress=None):
+    """Yield sessions from a log file as soon as each one is complete.
+
+    Only the session currently being read is kept in memory, so logs of
+    any size can be processed with bounded memory. Sessions without
+    coordinates are skipped, as they were by the original parser.
+
+    If given, `progress(bytes_read)` is called every `PROGRESS_LINES`
+    lines and once more when the file has been fully read.
+    """
+    parser = SessionParser()
+    feed_line = parser.feed_line
+
+    bytes_read = 0
+    lines = 0
+    fixes = 0
+    # Parse time only: the clock is stopped while the consumer has a session
+    elapsed = 0.0
+    started = time.perf_counter()
+
+    try:
+        with open(file_path, "rb") as fh:
+            for raw in fh:
+                bytes_read += len(raw)
+                lines += 1
+                if progress is not None and lines % PROGRESS_LINES == 0:
+                    progress(bytes_read)
+
+                line = raw.decode("utf-8", "replace").strip()
+                if not line:
+                    continue
+
+                done = feed_line(line)
+                if done is not None:
+                    fixes += len(done["coords"])
+                    elapsed += time.perf_counter() - started
+                    started = None
+                    yield done
+                    started = time.perf_counter()
+
+        if progress is not None:
+            progress(bytes_read)
+
+        last = parser.close()
+        if last is not None:
+            fixes += len(last["coords"])
+            elapsed += time.perf_counter() - started
+            started = None
+            yield last
+    finally:
+        if started is not None:
+            elapsed += time.perf_counter() - started
+        PERF.record("parse", elapsed, bytes=bytes_read, lines=lines, fixes=fixes)
+
+
+def parse_log_data(file_path, on_session=None):
+    """Parse log file into sessions with coordinates.
+
+    Thin wrapper around `iter_sessions`; `on_session(session)` is called
+    for each session as soon as it has been read.
+    """
+    sessions = []
+
+    try:
+        for session in iter_sessions(file_path):
+            sessions.append(session)
+            print(f"Session {len(sessions)}: {len(session['coords'])} coordinates, Date: {session.get('date', 'N/A')}")
+            if on_session is not None:
+                on_session(session)
+    except Exception as e:
+        print(f"Error parsing file: {e}")
+
+    print(f"Parsed {len(sessions)} sessions")
+    return sessions
+
+
+def is_meta_line(line):
+    return line.startswith(("=", "Date:", "Time:", "Session:"))
+
+
+def _line_at(mm, pos, end):
+    """Return the decoded line starting at `pos` and the offset after it."""
+    nl = mm.find(b"\n", pos, end)
+    if nl == -1:
+        nl = end
+    return mm[pos:nl].decode("utf-8", "replace").strip(), nl + 1
+
+
+def _index_block(mm, path, start, end):
+    session = {"date": None, "time": None, "coords": None, "summary": None,
+               "summary_text": "", "stats": None, "source": (path, start, end)}
+
+    header = mm[start:min(end, start + HEADER_BYTES)].decode("utf-8", "replace")
+    for line in header.splitlines():
+        line = line.strip()
+        if line.startswith("Date:"):
+            session["date"] = line[5:].strip()
+        elif line.startswith("Time:"):
+            session["time"] = line[5:].strip()
+
+    pos = mm.rfind(b"Session:", start, end)
+    if pos != -1:
+        session["summary"], _ = _line_at(mm, pos, end)
+        session["summary_text"] = summary_text(session["summary"])
+
+    # Only keep blocks with at least one fix, like iter_sessions
+    pos = start
+    while pos < end:
+        line, pos = _line_at(mm, pos, end)
+        if line and not is_meta_line(line) and parse_coord_line(line) is not None:
+            return session
+    return None
+
+
+def index_sessions(file_path):
+    """Scan a log for session boundaries without parsing coordinates.
+
+    The file is memory-mapped and only each block's header, summary line
+    and first fix are looked at. The returned records have `coords` set to
+    None and carry a `source` (path, start, end) byte range so that
+    `load_coords` can parse the fixes when the session is opened.
+    """
+    sessions = []
+    marker = SESSION_MARKER.encode()
+
+    with open(file_path, "rb") as fh:
+        size = os.fstat(fh.fileno()).st_size
+        if size == 0:
+            return sessions
+
+        with PERF.timer("index", bytes=size), \
+                mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            starts = []
+            pos = mm.find(marker)
+            if pos != 0:
+                starts.append(0)  # fixes logged before the first marker
+            while pos != -1:
+                starts.append(pos)
+                pos = mm.find(marker, pos + len(marker))
+
+            for start, end in zip(starts, starts[1:] + [size]):
+                session = _index_block(mm, file_path, start, end)
+                if session is not None:
+                    sessions.append(session)
+
+    return sessions
+
+
+def load_coords(session):
+    """Return a session's fixes, parsing them first if it was only indexed."""
+    coords = session["coords"]
+    if coords is not None:
+        return coords
+
+    path, start, end = session["source"]
+    with open(path, "rb") as fh:
+        fh.seek(start)
+        data = fh.read(end - start)
+
+    coords = Track()
+    with PERF.timer("load_coords", bytes=len(data)):
+        for line in data.decode("utf-8", "replace").splitlines():
+            line = line.strip()
+            if not line or is_meta_line(line):
+                continue
+            fix = parse_coord_line(line)
+            if fix is not None:
+                coords.append_fix(*fix)
+
+    # Another thread may have loaded (and started extending) it meanwhile
+    with _LOAD_LOCK:
+        if session["coords"] is None:
+            session["coords"] = coords
+        return session["coords"]
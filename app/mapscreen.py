@@ -0,0 +1,1309 @@
+"""The map screen: a session's route, fix dots and markers on a MapView.
+
+Imported by `ui` the first time a session is opened, so that
+`kivy_garden.mapview`, the tile store and the map layers stay out of the
+app's start-up.
+"""
+
+import math
+import os
+from array import array
+from collections import OrderedDict
+from kivy.uix.screenmanager import Screen
+from kivy.uix.boxlayout import BoxLayout
+from kivy.uix.button import Button
+from kivy.uix.label import Label
+from kivy.uix.slider import Slider
+from kivy.uix.widget import Widget
+from kivy.core.text.markup import MarkupLabel
+from kivy.graphics import (Color, Line, Rectangle, RoundedRectangle, Mesh,
+                           InstructionGroup, PushMatrix, PopMatrix, Translate)
+from kivy.graphics.texture import Texture
+from kivy.clock import Clock
+from kivy.metrics import sp
+from kivy.utils import get_color_from_hex
+
+# mapview imports
+from kivy_garden.mapview import MapView, MapMarkerPopup, MapLayer
+
+from analytics import describe, format_duration, session_stats
+from geo import PointGrid, ProjectionCache, SegmentIndex
+from perf import PERF
+from tiles import StoreMapSource
+from timeline import TimeIndex
+from track import format_hms
+
+
+# Set RUNNING_COMPANION_DEBUG=1 to log what the map layers draw
+DEBUG = bool(os.environ.get("RUNNING_COMPANION_DEBUG"))
+
+# Single-file tile store; RUNNING_COMPANION_TILE_URL points the map at a
+# self-hosted tile server, the only kind routes are prefetched from
+TILE_STORE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tiles.mbtiles")
+TILE_URL = os.environ.get("RUNNING_COMPANION_TILE_URL")
+
+# Douglas-Peucker tolerance for route vertices, in world pixels
+ROUTE_TOLERANCE = 0.5
+# Vertices per bounding box when culling the route to the viewport
+ROUTE_CHUNK = 128
+
+# Live follow: vertices/dots per appended Line or Mesh, and how often the
+# header stats are recomputed, in seconds
+TAIL_CHUNK = 256
+FOLLOW_STATS_INTERVAL = 5.0
+
+# Speed colours: ramp from slow to fast, texels in the ramp texture, and
+# route vertices per strip Mesh (two Mesh vertices each, 16-bit indices)
+SPEED_RAMP = ('#2b83ba', '#abdda4', '#ffffbf', '#fdae61', '#d7191c')
+SPEED_RAMP_SIZE = 256
+MAX_STRIP = 32768
+
+# Intermediate fix dots, in screen pixels
+DOT_RADIUS = 6
+DOT_INNER_RADIUS = 4
+DOT_SPACING = 12
+DOT_TEXTURE_SIZE = 24
+# Mesh indices are 16-bit and each dot takes four vertices
+MAX_DOTS = 65536 // 4
+
+# Tapping within TAP_RADIUS screen pixels of a fix selects it; a touch that
+# moved more than TAP_SLOP pixels is a pan, not a tap
+TAP_RADIUS = 15
+TAP_SLOP = 10
+
+# Sessions whose layers and markers are kept for a quick reopen
+RENDER_CACHE_SIZE = 4
+
+# Seconds of the session highlighted around the timeline scrubber's time
+SCRUB_WINDOW = 120
+
+# Marker and popup text: rendered textures kept, and padding in pixels
+TEXT_CACHE_SIZE = 512
+BUBBLE_PADDING = 5
+# Cache keys hold colours, so they are tuples
+TIME_COLOR = tuple(get_color_from_hex('#e94560'))
+_DOT_TEXTURE = None
+_SPEED_TEXTURE = None
+_TEXT_TEXTURES = OrderedDict()
+
+
+class SharedProjection:
+    """The `ProjectionCache` of a session, shared by all of its layers.
+
+    `get` rebuilds it, once for every layer, when the map source's tile
+    size changes; `generation` counts the rebuilds and the times the
+    cache rebuilt its levels instead of appending to them (see
+    `ProjectionCache.revision`).
+    """
+
+    def __init__(self, coords):
+        self.coords = coords
+        self.cache = None
+        self.generation = 0
+        self._revision = None
+
+    def get(self, tile_size):
+        if self.cache is None or self.cache.tile_size != tile_size:
+            self.cache = ProjectionCache(self.coords, tile_size)
+            self.generation += 1
+        # Catch up with a grown track now, as that may rebuild the levels
+        self.cache.reference
+        if self.cache.revision != self._revision:
+            self._revision = self.cache.revision
+            self.generation += 1
+        return self.cache
+
+
+class FrameMapLayer(MapLayer):
+    """MapLayer of a session's fixes that updates at most once per frame.
+
+    MapView may call `reposition` several times per frame while panning or
+    flinging; here it only arms a trigger, and subclasses do the actual
+    work in `update`, once, right before the next frame is drawn. Layers
+    of one session should share a `SharedProjection`.
+    """
+
+    def __init__(self, coords, projection=None, **kwargs):
+        super().__init__(**kwargs)
+        self.coords = coords
+        self.shared = SharedProjection(coords) if projection is None else projection
+        self._generation = None
+        self._trigger_update = Clock.create_trigger(self._timed_update, -1)
+        self._perf_name = f"reposition.{type(self).__name__}"
+
+    def _projection(self, mapview):
+        """Return `(projection, rebuilt)` for the map's tile size.
+
+        `rebuilt` is true when the projection changed since this layer
+        last asked, so whatever it derived from the old one is stale.
+        """
+        projection = self.shared.get(mapview.map_source.dp_tile_size)
+        rebuilt = self._generation != self.shared.generation
+        self._generation = self.shared.generation
+        return projection, rebuilt
+
+    def _place(self, mapview, ox, oy):
+        """Move `self.translate` so world pixel (ox, oy) lands on its screen spot."""
+        vx, vy = mapview.viewport_pos
+        scale = mapview.scale
+        self.translate.xy = (
+            (ox - vx) * scale + mapview.x,
+            (oy - vy) * scale + mapview.y
+        )
+
+    def reposition(self):
+        PERF.count("reposition.requests")
+        self._trigger_update()
+
+    def _timed_update(self, dt):
+        with PERF.timer(self._perf_name):
+            self.update()
+
+    def update(self):
+        pass
+
+
+class RouteLayer(FrameMapLayer):
+    """Draws the route, as a plain line or coloured by speed.
+
+    The canvas instructions are created once; redraws only replace the
+    points of a pool of Line instructions, one shadow/main pair per
+    visible run of the route. With `speed_colors` each run's main line is
+    a triangle-strip Mesh instead, whose texture coordinates index a
+    colour ramp by the fixes' speed, so the gradient needs no Color
+    instruction per segment. Fixes appended while following a live log
+    go into short tail runs, so the existing ones are left untouched.
+    """
+    
+    def __init__(self, coords, projection=None, speed_colors=False, **kwargs):
+        super().__init__(coords, projection, **kwargs)
+        self.speed_colors = speed_colors
+        self._segments = None
+        self._covered = None
+        self._zoom = None
+        self._scale = None
+        self._drawn = 0
+        self._used = 0
+        self._tail = None
+        self._speed_u = None
+        self.shadow_lines = []
+        self.main_lines = []
+        self.meshes = []
+        
+        with self.canvas:
+            PushMatrix()
+            self.translate = Translate()
+            # Draw shadow/outline
+            Color(0.2, 0.2, 0.3, 0.4)
+            self.shadow_group = InstructionGroup()
+            # Draw main line
+            Color(0.2, 0.6, 1.0, 0.9)  # Nice blue color
+            self.main_group = InstructionGroup()
+            # Or the speed-coloured strips
+            Color(1, 1, 1, 0.9)
+            self.speed_group = InstructionGroup()
+            PopMatrix()
+        
+        if DEBUG:
+            print(f"RouteLayer created with {len(coords)} coordinates")
+
+    def set_speed_colors(self, enabled):
+        self.speed_colors = enabled
+        self._zoom = None
+        self.reposition()
+
+    def update(self):
+        mapview = self.parent
+        if not self.coords or mapview is None:
+            return
+
+        zoom = mapview.zoom
+        scale = mapview.scale
+        projection, rebuilt = self._projection(mapview)
+        if rebuilt:
+            self._zoom = None
+
+        # Scale stays below 2 within a zoom level, so half a world pixel of
+        # simplification error never reaches a full screen pixel
+        ox, oy, xs, ys = projection.get(zoom, ROUTE_TOLERANCE)
+        area = _visible_area(mapview, ox, oy)
+
+        # Vertices only change with zoom/scale or when the view leaves the
+        # area drawn last time; any other pan just moves the origin
+        if zoom != self._zoom:
+            self._segments = SegmentIndex(xs, ys, ROUTE_CHUNK)
+        else:
+            self._segments.extend(xs, ys)
+        if zoom != self._zoom or scale != self._scale or not _covers(self._covered, area):
+            self._zoom = zoom
+            self._scale = scale
+            self._covered = _expand(area)
+            self._draw(xs, ys, scale, self._segments.query(*self._covered))
+            self._drawn = len(xs)
+        elif len(xs) > self._drawn:
+            self._append(xs, ys, scale)
+
+        self._place(mapview, ox, oy)
+
+    def _line_pair(self, i):
+        while len(self.main_lines) <= i:
+            shadow = Line(points=[], width=6, cap='round', joint='round')
+            main = Line(points=[], width=4, cap='round', joint='round')
+            self.shadow_group.add(shadow)
+            self.main_group.add(main)
+            self.shadow_lines.append(shadow)
+            self.main_lines.append(main)
+        return self.shadow_lines[i], self.main_lines[i]
+
+    def _mesh(self, i):
+        while len(self.meshes) <= i:
+            mesh = Mesh(mode='triangle_strip', texture=_speed_texture())
+            self.speed_group.add(mesh)
+            self.meshes.append(mesh)
+        return self.meshes[i]
+
+    def _speed_coords(self):
+        """Colour ramp coordinate of every fix, computed once per session."""
+        speeds = self.coords.speed
+        if self._speed_u is None:
+            ordered = sorted(speeds)
+            # Ignore outliers when spreading the ramp over the speeds
+            lo = ordered[len(ordered) // 20]
+            hi = ordered[len(ordered) * 19 // 20]
+            self._speed_range = (lo, max(hi - lo, 1e-6))
+            self._speed_u = array("f")
+        if len(self._speed_u) < len(speeds):
+            lo, span = self._speed_range
+            n = SPEED_RAMP_SIZE
+            self._speed_u.extend([
+                (0.5 + min(max((v - lo) / span, 0.0), 1.0) * (n - 1)) / n
+                for v in speeds[len(self._speed_u):]
+            ])
+        return self._speed_u
+
+    def _draw(self, xs, ys, scale, runs):
+        # A Mesh holds 65536 vertices, two per route vertex
+        pieces = []
+        for start, stop in runs:
+            while stop - start >= 2:
+                end = min(stop, start + MAX_STRIP)
+                pieces.append((start, end))
+                start = end - 1
+        if DEBUG:
+            print(f"RouteLayer: Drawing {sum(b - a for a, b in pieces)} points in {len(pieces)} runs from {len(self.coords)} coords")
+
+        for i, (start, stop) in enumerate(pieces):
+            self._draw_run(i, xs, ys, scale, start, stop)
+        for i in range(len(pieces), self._used):
+            self._clear_run(i)
+        self._used = len(pieces)
+        self._tail = None
+
+    def _draw_run(self, i, xs, ys, scale, start, stop):
+        points = [v * scale for k in range(start, stop) for v in (xs[k], ys[k])]
+        shadow, main = self._line_pair(i)
+        shadow.points = points
+        if self.speed_colors:
+            main.points = []
+            speed_u = self._speed_coords()
+            indices = self.shared.cache.source_indices(self._zoom, ROUTE_TOLERANCE)
+            if indices is None:
+                us = speed_u[start:stop]
+            else:
+                us = [speed_u[indices[k]] for k in range(start, stop)]
+            mesh = self._mesh(i)
+            mesh.vertices = _speed_strip(points, us, 2.0)
+            mesh.indices = list(range(2 * (stop - start)))
+        else:
+            main.points = points
+            if i < len(self.meshes):
+                self.meshes[i].vertices = []
+                self.meshes[i].indices = []
+
+    def _clear_run(self, i):
+        self.shadow_lines[i].points = []
+        self.main_lines[i].points = []
+        if i < len(self.meshes):
+            self.meshes[i].vertices = []
+            self.meshes[i].indices = []
+
+    def _append(self, xs, ys, scale):
+        """Draw the vertices added since the last draw as a tail run.
+
+        The tail run is redrawn until it spans TAIL_CHUNK vertices, then a
+        new one is started; no other run is touched.
+        """
+        if self._tail is None or len(xs) - self._tail[1] > TAIL_CHUNK:
+            # Start a new run at the last vertex drawn
+            self._tail = (self._used, max(self._drawn - 1, 0))
+            self._used += 1
+        i, start = self._tail
+        self._draw_run(i, xs, ys, scale, start, len(xs))
+        self._drawn = len(xs)
+
+
+class HighlightLayer(FrameMapLayer):
+    """Draws the fixes of a time window over the route.
+
+    `set_span` takes the window as a fix index range, as found by a
+    `TimeIndex`; only that range is turned into line points, and only
+    when it, the zoom or the scale changed.
+    """
+
+    def __init__(self, coords, projection=None, **kwargs):
+        super().__init__(coords, projection, **kwargs)
+        self.span = None
+        self._drawn = None
+
+        with self.canvas:
+            PushMatrix()
+            self.translate = Translate()
+            Color(*get_color_from_hex('#ffd166'))
+            self.line = Line(points=[], width=5, cap='round', joint='round')
+            PopMatrix()
+
+    def set_span(self, span):
+        """Highlight fixes `start:stop`, or nothing for None."""
+        self.span = span
+        self.reposition()
+
+    def update(self):
+        mapview = self.parent
+        if mapview is None:
+            return
+        if self.span is None:
+            self.line.points = []
+            self._drawn = None
+            return
+
+        zoom = mapview.zoom
+        scale = mapview.scale
+        projection, rebuilt = self._projection(mapview)
+        if rebuilt:
+            self._drawn = None
+
+        ox, oy, xs, ys = projection.get(zoom)
+        key = (self.span, zoom, scale)
+        if key != self._drawn:
+            start, stop = self.span
+            self.line.points = [v * scale for k in range(start, stop) for v in (xs[k], ys[k])]
+            self._drawn = key
+
+        self._place(mapview, ox, oy)
+
+
+def _speed_texture():
+    """Colour ramp from slow (blue) to fast (red), built once."""
+    global _SPEED_TEXTURE
+    if _SPEED_TEXTURE is not None:
+        return _SPEED_TEXTURE
+
+    stops = [get_color_from_hex(c) for c in SPEED_RAMP]
+    buf = bytearray()
+    for i in range(SPEED_RAMP_SIZE):
+        t = i / (SPEED_RAMP_SIZE - 1) * (len(stops) - 1)
+        k = min(int(t), len(stops) - 2)
+        f = t - k
+        for c in range(3):
+            buf.append(int(255 * (stops[k][c] * (1.0 - f) + stops[k + 1][c] * f)))
+        buf.append(255)
+
+    texture = Texture.create(size=(SPEED_RAMP_SIZE, 1), colorfmt='rgba')
+    texture.blit_buffer(bytes(buf), colorfmt='rgba', bufferfmt='ubyte')
+    texture.wrap = 'clamp_to_edge'
+    _SPEED_TEXTURE = texture
+    return texture
+
+
+def _speed_strip(points, us, half_width):
+    """Triangle-strip vertices (x, y, u, v) of a polyline `half_width` wide.
+
+    Each vertex is offset along the normal of the direction from its
+    previous to its next neighbour; `us` are the ramp coordinates.
+    """
+    n = len(points) // 2
+    vertices = []
+    for k in range(n):
+        x = points[2 * k]
+        y = points[2 * k + 1]
+        a = 2 * max(k - 1, 0)
+        b = 2 * min(k + 1, n - 1)
+        dx = points[b] - points[a]
+        dy = points[b + 1] - points[a + 1]
+        d = math.hypot(dx, dy) or 1.0
+        nx = -dy / d * half_width
+        ny = dx / d * half_width
+        u = us[k]
+        vertices.extend((x + nx, y + ny, u, 0.5, x - nx, y - ny, u, 0.5))
+    return vertices
+
+
+def _visible_area(mapview, ox, oy):
+    """The map's visible rectangle in world pixels relative to (ox, oy)."""
+    scale = mapview.scale
+    vx, vy = mapview.viewport_pos
+    left = vx - ox
+    bottom = vy - oy
+    return (left, bottom, left + mapview.width / scale, bottom + mapview.height / scale)
+
+
+def _expand(area):
+    """Grow an area by its own size on every side."""
+    left, bottom, right, top = area
+    w = right - left
+    h = top - bottom
+    return (left - w, bottom - h, right + w, top + h)
+
+
+def _covers(covered, area):
+    return (covered is not None
+            and covered[0] <= area[0] and covered[1] <= area[1]
+            and covered[2] >= area[2] and covered[3] >= area[3])
+
+
+def _dot_texture():
+    """Pre-render the two-tone dot once; every dot is a quad sampling it."""
+    global _DOT_TEXTURE
+    if _DOT_TEXTURE is not None:
+        return _DOT_TEXTURE
+
+    size = DOT_TEXTURE_SIZE
+    outer = get_color_from_hex('#0f3460')
+    inner = get_color_from_hex('#53d9ff')
+    half = size / 2.0
+    inner_edge = DOT_INNER_RADIUS / DOT_RADIUS
+    buf = bytearray()
+    for y in range(size):
+        for x in range(size):
+            # Distance from the centre, 1.0 at the rim; edges are smoothed
+            # over about one texel
+            d = math.hypot(x + 0.5 - half, y + 0.5 - half) / half
+            mix = min(max((inner_edge - d) * half + 0.5, 0.0), 1.0)
+            alpha = min(max((1.0 - d) * half + 0.5, 0.0), 1.0)
+            for c in range(3):
+                buf.append(int(255 * (inner[c] * mix + outer[c] * (1.0 - mix))))
+            buf.append(int(255 * alpha))
+
+    texture = Texture.create(size=(size, size), colorfmt='rgba')
+    texture.blit_buffer(bytes(buf), colorfmt='rgba', bufferfmt='ubyte')
+    _DOT_TEXTURE = texture
+    return texture
+
+
+def _add_dot(vertices, indices, sx, sy):
+    """Append the textured quad of one dot centred on (sx, sy)."""
+    r = DOT_RADIUS
+    k = len(vertices) // 4
+    vertices.extend((
+        sx - r, sy - r, 0, 0,
+        sx + r, sy - r, 1, 0,
+        sx + r, sy + r, 1, 1,
+        sx - r, sy + r, 0, 1
+    ))
+    indices.extend((k, k + 1, k + 2, k + 2, k + 3, k))
+
+
+class CoordinateDotsLayer(FrameMapLayer):
+    """Draws dots for intermediate coordinates.
+
+    All dots are textured quads in a single Mesh. Only dots within one
+    screen of the viewport are emitted (found through a SegmentIndex), and at most one per
+    `DOT_SPACING` pixel cell so dots never pile up when zoomed out. The
+    vertices are rebuilt on zoom/scale changes or when the viewport leaves
+    the covered area; any other pan only moves a Translate. Dots for fixes
+    appended while following a live log go into small tail meshes.
+    """
+    
+    def __init__(self, coords, projection=None, **kwargs):
+        super().__init__(coords, projection, **kwargs)
+        self._segments = None
+        self._zoom = None
+        self._scale = None
+        self._covered = None
+        self._seen = set()
+        self._drawn = 0
+        self._tail = None
+        
+        with self.canvas:
+            PushMatrix()
+            self.translate = Translate()
+            Color(1, 1, 1, 1)
+            self.mesh = Mesh(mode='triangles', texture=_dot_texture())
+            self.tail_group = InstructionGroup()
+            PopMatrix()
+
+    def update(self):
+        mapview = self.parent
+        # Start and finish have their own markers
+        if len(self.coords) < 3 or mapview is None:
+            return
+
+        zoom = mapview.zoom
+        scale = mapview.scale
+        projection, rebuilt = self._projection(mapview)
+        if rebuilt:
+            self._zoom = None
+
+        ox, oy, xs, ys = projection.get(zoom)
+        area = _visible_area(mapview, ox, oy)
+
+        if zoom != self._zoom:
+            self._segments = SegmentIndex(xs, ys, ROUTE_CHUNK)
+        else:
+            self._segments.extend(xs, ys)
+        if zoom != self._zoom or scale != self._scale or not _covers(self._covered, area):
+            self._zoom = zoom
+            self._scale = scale
+            self._covered = _expand(area)
+            self._build(xs, ys, scale, self._covered)
+        elif len(xs) > self._drawn:
+            self._append(xs, ys, scale)
+
+        self._place(mapview, ox, oy)
+
+    def _build(self, xs, ys, scale, bounds):
+        x0, y0, x1, y1 = bounds
+        cell = DOT_SPACING / scale
+        seen = set()
+        vertices = []
+        indices = []
+
+        # Only walk the chunks of the route inside the bounds; start and
+        # finish are skipped
+        last = len(xs) - 1
+        visible = (
+            i for start, stop in self._segments.query(*bounds)
+            for i in range(max(start, 1), min(stop, last))
+        )
+        for i in visible:
+            x = xs[i]
+            y = ys[i]
+            if x < x0 or x > x1 or y < y0 or y > y1:
+                continue
+            key = (int(x // cell), int(y // cell))
+            if key in seen:
+                continue
+            seen.add(key)
+            _add_dot(vertices, indices, x * scale, y * scale)
+            if len(seen) == MAX_DOTS:
+                break
+
+        self.mesh.vertices = vertices
+        self.mesh.indices = indices
+        self.tail_group.clear()
+        self._tail = None
+        self._seen = seen
+        self._drawn = len(xs)
+
+    def _append(self, xs, ys, scale):
+        """Add dots for the fixes appended since the last build.
+
+        The previous finish is an intermediate fix now; the new one is
+        not. Dots go into a tail mesh of up to TAIL_CHUNK dots, so the
+        main mesh is left untouched.
+        """
+        cell = DOT_SPACING / scale
+        touched = []
+        for i in range(max(self._drawn - 1, 1), len(xs) - 1):
+            x = xs[i]
+            y = ys[i]
+            key = (int(x // cell), int(y // cell))
+            if key in self._seen:
+                continue
+            self._seen.add(key)
+
+            # 16 floats per dot
+            if self._tail is None or len(self._tail[1]) >= TAIL_CHUNK * 16:
+                mesh = Mesh(mode='triangles', texture=_dot_texture())
+                self.tail_group.add(mesh)
+                self._tail = (mesh, [], [])
+            if not touched or touched[-1] is not self._tail:
+                touched.append(self._tail)
+            _add_dot(self._tail[1], self._tail[2], x * scale, y * scale)
+
+        for mesh, vertices, indices in touched:
+            mesh.vertices = vertices
+            mesh.indices = indices
+        self._drawn = len(xs)
+
+
+def _text_texture(text, font_size, color):
+    """Texture of a line of markup text, rendered once per distinct text."""
+    key = (text, font_size, color)
+    texture = _TEXT_TEXTURES.get(key)
+    if texture is not None:
+        _TEXT_TEXTURES.move_to_end(key)
+        return texture
+    label = MarkupLabel(text=text, font_size=sp(font_size), color=color)
+    label.refresh()
+    texture = label.texture
+    _TEXT_TEXTURES[key] = texture
+    if len(_TEXT_TEXTURES) > TEXT_CACHE_SIZE:
+        _TEXT_TEXTURES.popitem(last=False)
+    return texture
+
+
+class InfoBubble(Widget):
+    """Rounded box with a few lines of text, used by markers and popups.
+
+    The text is drawn as Rectangles textured by `_text_texture` instead of
+    Label widgets, so `set_lines` on a reused bubble only swaps textures:
+    no widgets are created and a text shown before is not rendered again.
+    `rows` gives the share of the height of each line.
+    """
+
+    def __init__(self, size, rows, border_width=2, **kwargs):
+        super().__init__(size_hint=(None, None), size=size, **kwargs)
+        self.rows = rows
+        self.border_width = border_width
+        with self.canvas:
+            Color(*get_color_from_hex('#16213e'))
+            self.bg = RoundedRectangle(radius=[10])
+            self.border_color = Color(*get_color_from_hex('#0f3460'))
+            self.border = Line(width=border_width)
+            Color(1, 1, 1, 1)
+            self.texts = [Rectangle(size=(0, 0)) for _ in rows]
+        self.bind(pos=self._layout, size=self._layout)
+        self._layout()
+
+    def set_border(self, color):
+        self.border_color.rgba = get_color_from_hex(color)
+
+    def set_lines(self, lines):
+        """Show `lines`, a `(markup, font_size, color)` tuple per row."""
+        for rect, (text, font_size, color) in zip(self.texts, lines):
+            texture = _text_texture(text, font_size, color)
+            rect.texture = texture
+            rect.size = texture.size
+        self._layout()
+
+    def _layout(self, *args):
+        x, y = self.pos
+        w, h = self.size
+        self.bg.pos = self.pos
+        self.bg.size = self.size
+        self.border.rounded_rectangle = (x, y, w, h, 10)
+
+        # Rows from the top, each line centred in its row
+        inner = h - 2 * BUBBLE_PADDING
+        top = y + h - BUBBLE_PADDING
+        for rect, share in zip(self.texts, self.rows):
+            row = inner * share
+            tw, th = rect.size
+            rect.pos = (x + (w - tw) / 2, top - (row + th) / 2)
+            top -= row
+
+
+def _fix_lines(fix):
+    return [
+        (f"[color=53d9ff][b]{fix.speed:.1f}[/b][/color] km/h", 12, (1, 1, 1, 1)),
+        (fix.timestamp, 10, TIME_COLOR),
+    ]
+
+
+class MarkerPool:
+    """Start and finish markers, reused across sessions and live updates.
+
+    Both are the same MapMarkerPopup with an `InfoBubble`; only the title
+    and border colour differ. Released markers are kept and refilled by
+    `acquire` instead of building new widget trees.
+    """
+
+    # Title and border colour of each kind of marker
+    KINDS = {
+        "start": ("START", '#00ff00'),
+        "finish": ("FINISH", '#ff0000'),
+    }
+
+    def __init__(self):
+        self.free = []
+
+    def acquire(self, kind, coord):
+        if self.free:
+            marker = self.free.pop()
+        else:
+            marker = MapMarkerPopup()
+            marker.bubble = InfoBubble((120, 80), (0.4, 0.3, 0.3))
+            marker.add_widget(marker.bubble)
+        self.fill(marker, kind, coord)
+        return marker
+
+    def fill(self, marker, kind, coord):
+        """Point `marker` at `coord` with the text of `kind`."""
+        title, color = self.KINDS[kind]
+        marker.lat = coord.lat
+        marker.lon = coord.lon
+        marker.bubble.set_border(color)
+        marker.bubble.set_lines([
+            (f"[color={color[1:]}][b]{title}[/b][/color]", 14, (1, 1, 1, 1)),
+            (f"[color=53d9ff][b]{coord.speed:.1f}[/b][/color] km/h", 11, (1, 1, 1, 1)),
+            (coord.timestamp, 10, TIME_COLOR),
+        ])
+
+    def release(self, marker):
+        if marker is not None:
+            marker.is_open = False
+            self.free.append(marker)
+
+
+class FixPickerLayer(FrameMapLayer):
+    """Shows speed and time of the intermediate fix nearest to a tap.
+
+    Instead of one invisible marker widget per fix, the fixes projected at
+    the current zoom are bucketed into a PointGrid and a single InfoBubble
+    is moved to whichever one was tapped. Tapping it again, or tapping
+    away from the route, hides the popup.
+    """
+    
+    def __init__(self, coords, projection=None, **kwargs):
+        super().__init__(coords, projection, **kwargs)
+        self.popup = InfoBubble((110, 60), (0.5, 0.5), border_width=1.5)
+        self.selected = None
+        self._grid = None
+        self._grid_zoom = None
+        self._grid_stop = 0
+
+    def _local(self, mapview, zoom):
+        """Projection at `zoom` and the viewport origin relative to it."""
+        projection, rebuilt = self._projection(mapview)
+        if rebuilt:
+            self._grid = None
+        ox, oy, xs, ys = projection.get(zoom)
+        vx, vy = mapview.viewport_pos
+        return ox, oy, xs, ys, vx, vy
+
+    def pick(self, x, y):
+        """Index of the intermediate fix within TAP_RADIUS of window (x, y), or -1."""
+        mapview = self.parent
+        if mapview is None or len(self.coords) < 3:
+            return -1
+
+        zoom = mapview.zoom
+        scale = mapview.scale
+        ox, oy, xs, ys, vx, vy = self._local(mapview, zoom)
+        if self._grid is None or self._grid_zoom != zoom:
+            # Start and finish have their own markers
+            with PERF.timer("hit_index", fixes=len(xs)):
+                self._grid = PointGrid(xs, ys, TAP_RADIUS, 1, len(xs) - 1)
+            self._grid_zoom = zoom
+            self._grid_stop = len(xs) - 1
+        elif len(xs) - 1 > self._grid_stop:
+            # The track grew; the old finish is an intermediate fix now
+            self._grid.add(max(self._grid_stop, 1), len(xs) - 1)
+            self._grid_stop = len(xs) - 1
+
+        with PERF.timer("hit_test"):
+            return self._grid.nearest(
+                (x - mapview.x) / scale + vx - ox,
+                (y - mapview.y) / scale + vy - oy,
+                TAP_RADIUS / scale
+            )
+
+    def on_touch_up(self, touch):
+        mapview = self.parent
+        if mapview is None or touch.grab_current is not None:
+            return False
+        # Ignore the end of a pan
+        if abs(touch.x - touch.ox) > TAP_SLOP or abs(touch.y - touch.oy) > TAP_SLOP:
+            return False
+        if not mapview.collide_point(*touch.pos):
+            return False
+
+        index = self.pick(touch.x, touch.y)
+        if index == -1 or index == self.selected:
+            self.hide()
+        else:
+            self.show(index)
+        return False
+
+    def show(self, index):
+        self.selected = index
+        self.popup.set_lines(_fix_lines(self.coords[index]))
+        if self.popup.parent is None:
+            self.add_widget(self.popup)
+        self.reposition()
+
+    def hide(self):
+        self.selected = None
+        if self.popup.parent is not None:
+            self.remove_widget(self.popup)
+
+    def update(self):
+        mapview = self.parent
+        if self.selected is None or mapview is None:
+            return
+
+        scale = mapview.scale
+        ox, oy, xs, ys, vx, vy = self._local(mapview, mapview.zoom)
+        x = (xs[self.selected] + ox - vx) * scale + mapview.x
+        y = (ys[self.selected] + oy - vy) * scale + mapview.y
+        self.popup.pos = (x - self.popup.width / 2, y + DOT_RADIUS)
+
+
+
+class PerfOverlay(Label):
+    """Frame time and the cost of the map's hot paths, drawn over the map."""
+
+    # Operations listed below the frame time
+    OPS = (
+        "reposition.RouteLayer",
+        "reposition.CoordinateDotsLayer",
+        "reposition.FixPickerLayer",
+        "projection",
+        "projection.zoom",
+        "simplify",
+        "hit_test",
+        "markers",
+        "tiles.decode",
+        "tiles.prefetch",
+        "follow.poll",
+    )
+
+    def __init__(self, **kwargs):
+        super().__init__(
+            markup=True,
+            size_hint=(None, None),
+            size=(360, 190),
+            pos_hint={"x": 0, "top": 0.88},
+            halign="left",
+            valign="top",
+            padding=[8, 8],
+            font_size="11sp",
+            color=(1, 1, 1, 0.9),
+            **kwargs
+        )
+        self.bind(size=self.setter('text_size'))
+        
+        with self.canvas.before:
+            Color(0, 0, 0, 0.6)
+            self.bg = Rectangle(pos=self.pos, size=self.size)
+        self.bind(pos=self._update_bg, size=self._update_bg)
+        self._events = []
+
+    def _update_bg(self, instance, value):
+        self.bg.pos = instance.pos
+        self.bg.size = instance.size
+
+    def start(self):
+        if not self._events:
+            self._events = [
+                Clock.schedule_interval(self._on_frame, 0),
+                Clock.schedule_interval(self._refresh, 0.25),
+            ]
+
+    def stop(self):
+        for event in self._events:
+            event.cancel()
+        self._events = []
+
+    def _on_frame(self, dt):
+        PERF.record("frame", dt)
+
+    def _refresh(self, dt):
+        frame = PERF.get("frame")
+        lines = []
+        if frame is not None:
+            lines.append(
+                f"[b]frame[/b] {frame.last * 1e3:5.1f} ms  "
+                f"p95 {frame.percentile(0.95) * 1e3:5.1f} ms  "
+                f"({1.0 / frame.last if frame.last else 0:.0f} fps)"
+            )
+        for name in self.OPS:
+            hist = PERF.get(name)
+            if hist is None:
+                continue
+            lines.append(
+                f"{name}: {hist.last * 1e3:.2f} ms  "
+                f"p95 {hist.percentile(0.95) * 1e3:.2f}  n={hist.count}"
+            )
+        if MapScreen.tile_source is not None:
+            stats = MapScreen.tile_source.stats()
+            lines.append(
+                f"tiles: mem {stats['memory_hits']}  disk {stats['disk_hits']}  "
+                f"net {stats['downloads']}  prefetched {stats['prefetched']}  "
+                f"{stats['disk_bytes'] / 1e6:.0f} MB"
+            )
+        lines.append("[color=aaaaaa]F12 hide, F10 export JSON[/color]")
+        self.text = "\n".join(lines)
+
+
+def _header_text(stats):
+    """Map header lines for a session's stats."""
+    return (
+        f"[b]{describe(stats)}[/b]\n"
+        f"avg {stats.avg_speed:.1f} km/h, max {stats.max_speed:.1f} km/h, "
+        f"{len(stats.stops)} stops, elapsed {format_duration(stats.elapsed)}"
+    )
+
+
+class SessionView:
+    """Everything the map needs to show one session again.
+
+    The layers keep their projection, spatial indexes and canvas
+    instructions, and the markers their widgets, so re-attaching them to
+    the MapView redraws nothing unless the viewport changed. `timeline`
+    answers the scrubber's time queries.
+    """
+
+    def __init__(self, session, layers, start_marker, finish_marker):
+        self.session = session
+        self.layers = layers
+        self.start_marker = start_marker
+        self.finish_marker = finish_marker
+        self.timeline = TimeIndex(session["coords"])
+        # (lat, lon, zoom) and the scrubber's time when the session was last left
+        self.viewport = None
+        self.scrub = None
+        self.shown = len(session["coords"])
+
+    @property
+    def highlight(self):
+        return self.layers[1]
+
+
+class MapScreen(Screen):
+    """Shows the selected session on a MapView.
+
+    The MapView is created once and keeps its tiles between visits. Each
+    session gets a `SessionView` whose layers and markers are swapped onto
+    it; the last RENDER_CACHE_SIZE views are kept, so reopening a recently
+    viewed session only re-attaches them at the viewport it was left at.
+    """
+    perf_overlay = None
+    tile_source = None
+    # Route coloured by speed; kept when switching sessions
+    speed_colors = False
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.session = None
+        self.view = None
+        self.views = OrderedDict()
+        self.markers = MarkerPool()
+        self.map_view = None
+        self.session_info = None
+        self.main_layout = None
+        self.message = Label()
+        self._scrub_ready = False
+        self._stats_trigger = Clock.create_trigger(self._refresh_header, FOLLOW_STATS_INTERVAL)
+
+    def _build(self):
+        """Create the header and the MapView, once."""
+        main_layout = BoxLayout(orientation="vertical")
+
+        # Header with gradient
+        header = BoxLayout(size_hint_y=None, height=70, padding=[10, 10], spacing=10)
+        
+        with header.canvas.before:
+            Color(*get_color_from_hex('#16213e'))
+            self.header_bg = Rectangle(pos=header.pos, size=header.size)
+        
+        header.bind(pos=self._update_header_bg, size=self._update_header_bg)
+        
+        session_info = Label(
+            markup=True,
+            size_hint_x=0.65,
+            color=get_color_from_hex('#ffffff'),
+            font_size='16sp'
+        )
+        
+        speed_btn = Button(
+            text="Plain" if MapScreen.speed_colors else "Speed",
+            size_hint_x=0.15,
+            background_normal='',
+            background_color=get_color_from_hex('#0f3460'),
+            color=get_color_from_hex('#ffffff'),
+            bold=True
+        )
+        speed_btn.bind(on_press=self.toggle_speed_colors)
+        
+        back_btn = Button(
+            text="Back",
+            size_hint_x=0.2,
+            background_normal='',
+            background_color=get_color_from_hex('#e94560'),
+            color=get_color_from_hex('#ffffff'),
+            bold=True
+        )
+        back_btn.bind(on_press=lambda b: setattr(self.manager, "current", "session_list"))
+        
+        header.add_widget(session_info)
+        header.add_widget(speed_btn)
+        header.add_widget(back_btn)
+        self.session_info = session_info
+
+        # The tile store outlives the MapView
+        if MapScreen.tile_source is None:
+            if TILE_URL:
+                # A self-hosted server: prefetching routes is fine
+                MapScreen.tile_source = StoreMapSource(TILE_STORE, url=TILE_URL,
+                                                       allow_prefetch=True)
+            else:
+                MapScreen.tile_source = StoreMapSource(TILE_STORE)
+        self.map_view = MapView(zoom=15, map_source=MapScreen.tile_source)
+
+        # Timeline scrubber: highlights SCRUB_WINDOW seconds around its time
+        footer = BoxLayout(size_hint_y=None, height=50, padding=[10, 5], spacing=10)
+        with footer.canvas.before:
+            Color(*get_color_from_hex('#16213e'))
+            self.footer_bg = Rectangle(pos=footer.pos, size=footer.size)
+        footer.bind(pos=self._update_footer_bg, size=self._update_footer_bg)
+
+        self.scrubber = Slider(step=1, size_hint_x=0.6, cursor_size=(24, 24))
+        self.scrubber.bind(value=self._on_scrub)
+        self.scrub_info = Label(
+            markup=True,
+            size_hint_x=0.4,
+            color=get_color_from_hex('#ffffff'),
+            font_size='12sp'
+        )
+        footer.add_widget(self.scrubber)
+        footer.add_widget(self.scrub_info)
+
+        main_layout.add_widget(header)
+        main_layout.add_widget(self.map_view)
+        main_layout.add_widget(footer)
+        self.main_layout = main_layout
+
+    def on_pre_enter(self):
+        session = getattr(self.manager, "selected_session", None)
+        if session is not None and session is self.session and self.view is not None:
+            self._refresh_header(0)
+            return
+        self._detach()
+        self.session = session
+
+        if not session:
+            self._show_message("No session selected")
+            return
+        coords = session.get("coords")
+        if not coords:
+            self._show_message("No coordinates in this session")
+            return
+
+        if self.map_view is None:
+            self._build()
+            # The MapView is laid out in the next frame
+            delay = 0.1
+        else:
+            delay = 0
+        if self.main_layout.parent is None:
+            self.clear_widgets()
+            self.add_widget(self.main_layout)
+            if self.perf_overlay is not None:
+                self.add_widget(self.perf_overlay)
+
+        self.session_info.text = _header_text(session_stats(session))
+        self._attach(self._view_for(session), delay)
+
+    def _show_message(self, text):
+        self.message.text = text
+        if self.message.parent is None:
+            self.clear_widgets()
+            self.add_widget(self.message)
+
+    def _view_for(self, session):
+        """The session's `SessionView`, from the cache or built now."""
+        key = id(session)
+        view = self.views.get(key)
+        if view is not None and view.session is session:
+            self.views.move_to_end(key)
+            return view
+
+        coords = session["coords"]
+        MapScreen.tile_source.prefetch_route(coords, self.map_view.zoom)
+
+        # The layers share one projection of the session
+        projection = SharedProjection(coords)
+        layers = (
+            RouteLayer(coords, projection=projection, speed_colors=MapScreen.speed_colors),
+            # The time window picked with the scrubber
+            HighlightLayer(coords, projection=projection),
+            # Dots for intermediate coordinates
+            CoordinateDotsLayer(coords, projection=projection),
+            # Tapping near an intermediate coordinate shows its speed and time
+            FixPickerLayer(coords, projection=projection),
+        )
+        with PERF.timer("markers"):
+            start_marker = self.markers.acquire("start", coords[0])
+            finish_marker = self.markers.acquire("finish", coords[-1]) if len(coords) > 1 else None
+
+        view = SessionView(session, layers, start_marker, finish_marker)
+        self.views[key] = view
+        while len(self.views) > RENDER_CACHE_SIZE:
+            _, old = self.views.popitem(last=False)
+            self.markers.release(old.start_marker)
+            self.markers.release(old.finish_marker)
+        return view
+
+    def _attach(self, view, delay):
+        """Put a view's layers and markers on the MapView and restore its viewport."""
+        map_view = self.map_view
+        coords = view.session["coords"]
+
+        route_layer = view.layers[0]
+        if route_layer.speed_colors != MapScreen.speed_colors:
+            route_layer.set_speed_colors(MapScreen.speed_colors)
+        for layer in view.layers:
+            map_view.add_layer(layer)
+        # Layers draw in the order added: keep the markers above the route
+        markers = map_view._default_marker_layer
+        if markers is not None:
+            map_view.remove_layer(markers)
+            map_view.add_layer(markers)
+        # A followed session may have grown while it was not shown
+        if len(coords) > view.shown:
+            view.shown = len(coords)
+            self._move_finish(view)
+        map_view.add_marker(view.start_marker)
+        if view.finish_marker is not None:
+            map_view.add_marker(view.finish_marker)
+        self.view = view
+        self._sync_scrubber()
+
+        def restore(dt):
+            if self.view is not view:
+                return
+            if view.viewport is None:
+                map_view.center_on(coords.lat[0], coords.lon[0])
+            else:
+                lat, lon, zoom = view.viewport
+                map_view.zoom = zoom
+                map_view.center_on(lat, lon)
+            for layer in view.layers:
+                layer.reposition()
+
+        if delay:
+            Clock.schedule_once(restore, delay)
+        else:
+            restore(0)
+
+    def _detach(self):
+        """Take the shown view off the MapView, remembering its viewport."""
+        view = self.view
+        if view is None:
+            return
+        map_view = self.map_view
+        center = map_view.get_latlon_at(map_view.width / 2, map_view.height / 2)
+        view.viewport = (center[0], center[1], map_view.zoom)
+        for layer in view.layers:
+            map_view.remove_layer(layer)
+        map_view.remove_marker(view.start_marker)
+        if view.finish_marker is not None:
+            map_view.remove_marker(view.finish_marker)
+        self.view = None
+
+    def on_leave(self):
+        if self.perf_overlay is not None:
+            self.perf_overlay.stop()
+
+    def on_enter(self):
+        if self.perf_overlay is not None:
+            self.perf_overlay.start()
+
+    def toggle_perf_overlay(self):
+        """Show or hide the frame time / per-layer cost overlay."""
+        if self.perf_overlay is None:
+            self.perf_overlay = PerfOverlay()
+            self.add_widget(self.perf_overlay)
+            if self.manager is not None and self.manager.current == self.name:
+                self.perf_overlay.start()
+        else:
+            self.perf_overlay.stop()
+            self.remove_widget(self.perf_overlay)
+            self.perf_overlay = None
+
+    def toggle_speed_colors(self, button):
+        """Switch the route between a plain line and speed colours."""
+        MapScreen.speed_colors = not MapScreen.speed_colors
+        button.text = "Plain" if MapScreen.speed_colors else "Speed"
+        if self.view is not None:
+            self.view.layers[0].set_speed_colors(MapScreen.speed_colors)
+
+    def live_update(self, session, previous):
+        """Show what a followed log appended.
+
+        `session` is the session being written and `previous` the one that
+        was being written before the last poll. If the map shows
+        `previous` and a new session started, it switches to the new one;
+        otherwise only the new fixes are drawn and the finish marker is
+        moved. The header stats are recomputed at most every
+        FOLLOW_STATS_INTERVAL seconds.
+        """
+        if self.manager is None or self.manager.current != self.name:
+            return
+        if session is not previous and self.session is previous:
+            self.manager.selected_session = session
+            self.on_pre_enter()
+            return
+        view = self.view
+        if self.session is not session or view is None:
+            return
+
+        coords = session["coords"]
+        if len(coords) <= view.shown:
+            return
+        view.shown = len(coords)
+        for layer in view.layers:
+            layer.reposition()
+        self._sync_scrubber()
+
+        if view.finish_marker is not None:
+            self.map_view.remove_marker(view.finish_marker)
+        self._move_finish(view)
+        self.map_view.add_marker(view.finish_marker)
+        self._stats_trigger()
+
+    def _move_finish(self, view):
+        """Put the view's finish marker on its session's last fix."""
+        coords = view.session["coords"]
+        with PERF.timer("markers"):
+            if view.finish_marker is None:
+                view.finish_marker = self.markers.acquire("finish", coords[-1])
+            else:
+                self.markers.fill(view.finish_marker, "finish", coords[-1])
+
+    def _sync_scrubber(self):
+        """Fit the scrubber to the shown session's time range."""
+        view = self.view
+        self._scrub_ready = False
+        scrubber = self.scrubber
+        scrubber.min = view.timeline.start
+        scrubber.max = max(view.timeline.end, scrubber.min + 1)
+        if view.scrub is None:
+            scrubber.value = scrubber.min
+            self.scrub_info.text = "Drag to highlight a time window"
+        else:
+            scrubber.value = view.scrub
+        self._scrub_ready = True
+
+    def _on_scrub(self, slider, value):
+        """Highlight the fixes within SCRUB_WINDOW seconds around `value`.
+
+        The window is found by binary search in the session's `TimeIndex`,
+        so a scrub step costs O(log n) plus the fixes it highlights.
+        """
+        view = self.view
+        if view is None or not self._scrub_ready:
+            return
+        t = int(value)
+        half = SCRUB_WINDOW // 2
+        stats = view.timeline.stats(t - half, t + half)
+        view.highlight.set_span((stats.start, stats.stop))
+        view.scrub = value
+        self.scrub_info.text = (
+            f"[b]{format_hms(t - half)}-{format_hms(t + half)}[/b]  "
+            f"{stats.distance / 1000.0:.2f} km, {stats.avg_speed:.1f} km/h"
+        )
+
+    def _update_footer_bg(self, instance, value):
+        self.footer_bg.pos = instance.pos
+        self.footer_bg.size = instance.size
+
+    def _refresh_header(self, dt):
+        if self.session is not None and self.session_info is not None:
+            self.session_info.text = _header_text(session_stats(self.session))
+
+    def _update_header_bg(self, instance, value):
+        self.header_bg.pos = instance.pos
+        self.header_bg.size = instance.size
@@ -0,0 +1,140 @@
+"""Lightweight timings and counters for the app's hot paths.
+
+Operations are timed into per-name histograms through the module-level
+`PERF` recorder:
+
+    with PERF.timer("projection", fixes=len(track)):
+        ...
+
+Keyword arguments are work units (bytes, lines, fixes...); the snapshot
+reports them as throughput per second of recorded time. `PERF.export`
+writes the snapshot as JSON so runs of different builds can be compared.
+"""
+
+import json
+import time
+from math import log2
+
+# Bucket k holds durations in [2**k, 2**(k+1)) microseconds
+_BUCKETS = 32
+
+
+class Histogram:
+    """Log2-bucketed duration histogram."""
+    __slots__ = ("count", "total", "min", "max", "last", "buckets", "units")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+        self.last = 0.0
+        self.buckets = [0] * _BUCKETS
+        self.units = {}
+
+    def add(self, seconds, units=None):
+        self.count += 1
+        self.total += seconds
+        self.last = seconds
+        if seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+        us = seconds * 1e6
+        k = int(log2(us)) if us >= 1.0 else 0
+        self.buckets[min(k, _BUCKETS - 1)] += 1
+        if units:
+            for name, value in units.items():
+                self.units[name] = self.units.get(name, 0) + value
+
+    def percentile(self, q):
+        """Upper bound of the bucket holding the `q` quantile, in seconds."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for k, n in enumerate(self.buckets):
+            seen += n
+            if seen >= target:
+                return min(2.0 ** (k + 1) / 1e6, self.max)
+        return self.max
+
+    def summary(self):
+        ms = 1e3
+        out = {
+            "count": self.count,
+            "total_ms": self.total * ms,
+            "mean_ms": self.total / self.count * ms if self.count else 0.0,
+            "min_ms": self.min * ms if self.count else 0.0,
+            "max_ms": self.max * ms,
+            "last_ms": self.last * ms,
+            "p50_ms": self.percentile(0.5) * ms,
+            "p95_ms": self.percentile(0.95) * ms,
+            "buckets_us": {f"<{2 ** (k + 1)}": n for k, n in enumerate(self.buckets) if n},
+        }
+        if self.units:
+            out["units"] = dict(self.units)
+            if self.total > 0:
+                out["per_second"] = {name: value / self.total for name, value in self.units.items()}
+        return out
+
+
+class _Timer:
+    __slots__ = ("perf", "name", "units", "start")
+
+    def __init__(self, perf, name, units):
+        self.perf = perf
+        self.name = name
+        self.units = units
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.perf.record(self.name, time.perf_counter() - self.start, **self.units)
+        return False
+
+
+class Perf:
+    """Collects operation timings and plain counters."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.ops = {}
+        self.counters = {}
+
+    def timer(self, name, **units):
+        return _Timer(self, name, units)
+
+    def record(self, name, seconds, **units):
+        hist = self.ops.get(name)
+        if hist is None:
+            hist = self.ops[name] = Histogram()
+        hist.add(seconds, units)
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def get(self, name):
+        return self.ops.get(name)
+
+    def reset(self):
+        self.started = time.time()
+        self.ops.clear()
+        self.counters.clear()
+
+    def snapshot(self):
+        return {
+            "started": self.started,
+            "elapsed_s": time.time() - self.started,
+            "ops": {name: hist.summary() for name, hist in sorted(self.ops.items())},
+            "counters": dict(sorted(self.counters.items())),
+        }
+
+    def export(self, path):
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump(self.snapshot(), fh, indent=2)
+
+
+PERF = Perf()
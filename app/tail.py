@@ -0,0 +1,88 @@
+"""Follow a log file while the device is still writing it.
+
+`LogTail` remembers how far the file has been read and on every `poll()`
+reads only the bytes appended since, feeding them to a `SessionParser`.
+Fixes are appended in place to the current session's `Track`, so the cost
+of a poll is proportional to the new data only.
+"""
+
+import os
+
+from logparser import SessionParser, is_meta_line, parse_coord_line
+
+# Longest line worth looking back for when resuming mid-line
+MAX_LINE = 256
+
+
+class LogTail:
+    """Incremental reader for the end of a growing log.
+
+    `offset` is where reading starts and `session` the session that the
+    bytes from there continue (typically the log's last session, as left
+    by the import). Sessions started after it are reported by `poll`.
+    """
+
+    def __init__(self, path, offset=0, session=None):
+        self.path = path
+        self.offset = offset
+        self.parser = SessionParser(session)
+        self.last = session
+        if offset > 0:
+            self._rewind_partial_line()
+
+    def _rewind_partial_line(self):
+        """Start at the beginning of a line the previous reader cut off.
+
+        If that half line was taken for a fix, the fix is dropped from
+        the session; it is read again in full by the next poll.
+        """
+        start = max(self.offset - MAX_LINE, 0)
+        try:
+            with open(self.path, "rb") as fh:
+                fh.seek(start)
+                head = fh.read(self.offset - start)
+        except OSError:
+            return
+        nl = head.rfind(b"\n")
+        if nl == len(head) - 1:
+            return
+        partial = head[nl + 1:].decode("utf-8", "replace").strip()
+        self.offset = start + nl + 1
+        coords = self.parser.current["coords"]
+        if coords and not is_meta_line(partial) and parse_coord_line(partial) is not None:
+            coords.pop()
+
+    @property
+    def current(self):
+        """The session being written, once it has a fix."""
+        session = self.parser.current
+        return session if session["coords"] else None
+
+    def poll(self):
+        """Read what was appended since the last call.
+
+        Returns the sessions that got their first fix since then, in file
+        order. If the file shrank (replaced or truncated) it is read again
+        from the start.
+        """
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return []
+        if size < self.offset:
+            self.offset = 0
+            self.parser = SessionParser()
+        if size == self.offset:
+            return []
+
+        with open(self.path, "rb") as fh:
+            fh.seek(self.offset)
+            data = fh.read(size - self.offset)
+        self.offset += len(data)
+
+        started = []
+        for session in self.parser.feed(data) + [self.current]:
+            if session is not None and session is not self.last:
+                self.last = session
+                started.append(session)
+        return started
@@ -0,0 +1,171 @@
+"""Bounded, two-tier cache for the map tiles.
+
+mapview keeps every downloaded tile in `cache/` forever and decodes the
+PNG again each time a tile scrolls back into view. `StoreMapSource` keeps
+the last `max_textures` decoded tiles as textures, so panning back over
+them needs neither disk I/O nor a decode, on top of a byte-budgeted
+single-file SQLite store (`TileStore`).
+
+With a self-hosted tile server it can also prefetch the tiles around a
+route, so a session opened afterwards is drawn without network
+round-trips. Bulk downloads are against the OpenStreetMap tile usage
+policy, so with the default OSM server tiles are only fetched on demand.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from io import BytesIO
+
+from kivy.core.image import Image as CoreImage
+from kivy_garden.mapview import MapSource
+from kivy_garden.mapview.downloader import Downloader
+
+from perf import PERF
+from tilestore import TileStore, fetch_tile, prefetch, route_tiles, tile_url
+
+MAX_TEXTURES = 192
+# Zoom levels prefetched around the current one, most useful first
+PREFETCH_ZOOMS = (0, 1, -1, 2, -2)
+
+
+class StoreMapSource(MapSource):
+    """MapSource backed by a single-file `TileStore`.
+
+    Tiles are stored under the source's URL template, so pointing the map
+    at another server never shows the old server's tiles. On first use the
+    loose files of mapview's cache directory are imported into the store.
+    Without network access the map shows whatever the store holds.
+
+    `prefetch_route` only downloads when `allow_prefetch` is set, which
+    must be reserved for self-hosted tile servers.
+    """
+
+    def __init__(self, path, max_store_bytes=None, max_textures=MAX_TEXTURES,
+                 allow_prefetch=False, **kwargs):
+        super().__init__(**kwargs)
+        self.max_textures = max_textures
+        self.textures = OrderedDict()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.downloads = 0
+        self.failures = 0
+        if max_store_bytes is None:
+            self.store = TileStore(path, source=self.url)
+        else:
+            self.store = TileStore(path, max_store_bytes, source=self.url)
+        self.allow_prefetch = allow_prefetch
+        if self.store.count() == 0:
+            imported = self.store.import_directory(self.cache_dir, self.cache_key)
+            if imported:
+                print(f"Imported {imported} cached tiles into {path}")
+        self.prefetched = 0
+        self._prefetch_cancel = None
+
+    def fill_tile(self, tile):
+        if tile.state == "done":
+            return
+
+        key = (tile.zoom, tile.tile_x, tile.tile_y)
+        texture = self.textures.get(key)
+        if texture is not None:
+            self.textures.move_to_end(key)
+            self.memory_hits += 1
+            PERF.count("tiles.memory_hits")
+            tile.texture = texture
+            tile.state = "need-animation"
+            return
+
+        Downloader.instance(cache_dir=self.cache_dir).submit(self._fetch, tile)
+
+    def _fetch(self, tile):
+        """Runs on a download thread: read the tile from the store or the network."""
+        key = (tile.zoom, tile.tile_x, tile.tile_y)
+        data = self.store.get(*key)
+        if data is not None:
+            self.disk_hits += 1
+            PERF.count("tiles.disk_hits")
+        else:
+            try:
+                data = fetch_tile(tile_url(self.url, *key, self.subdomains))
+            except (OSError, ValueError) as e:
+                self.failures += 1
+                PERF.count("tiles.failures")
+                print(f"Tile {key} unavailable: {e}")
+                return None
+            self.downloads += 1
+            PERF.count("tiles.downloads")
+            self.store.put(*key, data)
+        return self._set_tile, (tile, data)
+
+    def _set_tile(self, tile, data):
+        """Runs on the main thread: decode once and keep the texture."""
+        texture = self._decode(data, self.image_ext)
+        if texture is not None:
+            self._show(tile, texture)
+
+    def _decode(self, data, ext):
+        """Decode a tile's bytes into a texture, or None."""
+        start = time.perf_counter()
+        try:
+            texture = CoreImage(BytesIO(data), ext=ext, nocache=True).texture
+        except Exception as e:
+            print(f"Dropping unreadable tile: {e}")
+            self.failures += 1
+            return None
+        PERF.record("tiles.decode", time.perf_counter() - start)
+        return texture
+
+    def _show(self, tile, texture):
+        """Keep `texture` in the memory tier and hand it to `tile`."""
+        self.textures[(tile.zoom, tile.tile_x, tile.tile_y)] = texture
+        while len(self.textures) > self.max_textures:
+            self.textures.popitem(last=False)
+
+        tile.texture = texture
+        tile.state = "need-animation"
+
+    def prefetch_route(self, track, zoom):
+        """Fetch the tiles around `track` near `zoom` on a background thread.
+
+        Cancels the prefetch of the previously opened route, if any. Does
+        nothing unless `allow_prefetch` is set.
+        """
+        if self._prefetch_cancel is not None:
+            self._prefetch_cancel.set()
+            self._prefetch_cancel = None
+        if not self.allow_prefetch:
+            return
+        cancel = self._prefetch_cancel = threading.Event()
+
+        zooms = [zoom + dz for dz in PREFETCH_ZOOMS
+                 if self.min_zoom <= zoom + dz <= self.max_zoom]
+        tiles = route_tiles(track.lat, track.lon, zooms)
+
+        def run():
+            with PERF.timer("tiles.prefetch"):
+                fetched, failed = prefetch(self.store, self.url, tiles,
+                                           subdomains=self.subdomains, cancel=cancel)
+            self.prefetched += fetched
+            if fetched or failed:
+                print(f"Prefetched {fetched} tiles ({failed} unavailable)")
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def stats(self):
+        """Hit/miss counters and current cache sizes."""
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "downloads": self.downloads,
+            "failures": self.failures,
+            "textures": len(self.textures),
+            "disk_bytes": self.store.total,
+            "prefetched": self.prefetched,
+        }
+
+    def cleanup(self, max_bytes=None, drop_textures=False):
+        """Trim the store to budget and optionally empty the memory tier."""
+        self.store.cleanup(max_bytes)
+        if drop_textures:
+            self.textures.clear()
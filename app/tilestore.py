@@ -0,0 +1,281 @@
+"""Single-file tile store in the MBTiles layout, plus route-aware prefetch.
+
+Tiles live in one SQLite file instead of thousands of loose PNGs. The
+`tiles` table follows MBTiles (`zoom_level`, `tile_column`, `tile_row`
+counted from the bottom, `tile_data`), with two extra columns: `source`,
+the tile server the tile came from (part of the key, so servers never mix),
+and `last_used`, used to evict least recently used tiles past a byte budget
+shared by all sources. mapview's `tile_y` already counts rows from the
+bottom, so it is stored as is. Reads note the use in memory; the
+`last_used` updates are written in batches of TOUCH_BATCH.
+
+Prefetching only needs the standard library, so it can seed a store
+headlessly:
+
+    store = TileStore("tiles.mbtiles")
+    prefetch(store, "http://localhost:8000/{z}/{x}/{y}.png",
+             route_tiles(track.lat, track.lon, range(12, 17)))
+"""
+
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from math import cos, floor, log, pi, radians, tan
+
+MAX_STORE_BYTES = 500 * 1024 * 1024
+PREFETCH_WORKERS = 2
+PREFETCH_MAX_TILES = 600
+USER_AGENT = "RunningCompanion/1.0"
+# Tile reads whose last use is written in one transaction
+TOUCH_BATCH = 256
+
+# Loose mapview cache files: <cache_key>_<zoom>_<x>_<y>.<ext>
+_CACHE_FILE = re.compile(r"^(?P<key>\w+?)_(?P<z>\d+)_(?P<x>\d+)_(?P<y>\d+)\.\w+$")
+
+
+class TileStore:
+    """Thread-safe SQLite tile store; reads and writes tiles of `source`."""
+
+    def __init__(self, path, max_bytes=MAX_STORE_BYTES, source=""):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.source = source
+        self._lock = threading.Lock()
+        self._touched = {}
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.executescript("""
+                CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT);
+                CREATE TABLE IF NOT EXISTS tiles (
+                    source TEXT, zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER,
+                    tile_data BLOB, last_used REAL,
+                    PRIMARY KEY (source, zoom_level, tile_column, tile_row)
+                );
+                CREATE INDEX IF NOT EXISTS tiles_last_used ON tiles (last_used);
+            """)
+            self._db.execute(
+                "INSERT OR IGNORE INTO metadata VALUES ('format', 'png'), ('name', 'Running Companion')"
+            )
+        self.total = self._size()
+
+    def _size(self):
+        with self._lock:
+            row = self._db.execute("SELECT COALESCE(SUM(LENGTH(tile_data)), 0) FROM tiles").fetchone()
+        return row[0]
+
+    def get(self, zoom, x, y):
+        """Return the tile's bytes (and note the use), or None."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT tile_data FROM tiles "
+                "WHERE source=? AND zoom_level=? AND tile_column=? AND tile_row=?",
+                (self.source, zoom, x, y)
+            ).fetchone()
+            if row is None:
+                return None
+            self._touched[(zoom, x, y)] = time.time()
+            if len(self._touched) >= TOUCH_BATCH:
+                with self._db:
+                    self._flush_touched()
+        return row[0]
+
+    def _flush_touched(self):
+        """Write the last use of the tiles read since the last flush."""
+        if self._touched:
+            self._db.executemany(
+                "UPDATE tiles SET last_used=? "
+                "WHERE source=? AND zoom_level=? AND tile_column=? AND tile_row=?",
+                [(used, self.source, zoom, x, y)
+                 for (zoom, x, y), used in self._touched.items()]
+            )
+            self._touched.clear()
+
+    def has(self, zoom, x, y):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT 1 FROM tiles "
+                "WHERE source=? AND zoom_level=? AND tile_column=? AND tile_row=?",
+                (self.source, zoom, x, y)
+            ).fetchone()
+        return row is not None
+
+    def put(self, zoom, x, y, data):
+        self.put_many([(zoom, x, y, data)])
+
+    def put_many(self, tiles):
+        """Insert or replace `(zoom, x, y, data)` tuples in one transaction."""
+        now = time.time()
+        with self._lock, self._db:
+            for zoom, x, y, data in tiles:
+                key = (self.source, zoom, x, y)
+                old = self._db.execute(
+                    "SELECT LENGTH(tile_data) FROM tiles "
+                    "WHERE source=? AND zoom_level=? AND tile_column=? AND tile_row=?",
+                    key
+                ).fetchone()
+                self._db.execute(
+                    "INSERT OR REPLACE INTO tiles VALUES (?, ?, ?, ?, ?, ?)",
+                    key + (sqlite3.Binary(data), now)
+                )
+                self._touched.pop((zoom, x, y), None)
+                self.total += len(data) - (old[0] if old else 0)
+            self._evict()
+
+    def _evict(self, max_bytes=None):
+        budget = self.max_bytes if max_bytes is None else max_bytes
+        if self.total <= budget:
+            return
+        # Evict by up-to-date last uses
+        self._flush_touched()
+        while self.total > budget:
+            rows = self._db.execute(
+                "SELECT source, zoom_level, tile_column, tile_row, LENGTH(tile_data) FROM tiles "
+                "ORDER BY last_used LIMIT 64"
+            ).fetchall()
+            if not rows:
+                self.total = 0
+                return
+            for source, zoom, x, y, size in rows:
+                self._db.execute(
+                    "DELETE FROM tiles "
+                    "WHERE source=? AND zoom_level=? AND tile_column=? AND tile_row=?",
+                    (source, zoom, x, y)
+                )
+                self.total -= size
+                if self.total <= budget:
+                    return
+
+    def cleanup(self, max_bytes=None):
+        """Evict down to `max_bytes` (default: the configured budget)."""
+        with self._lock, self._db:
+            self._evict(max_bytes)
+
+    def count(self):
+        """Number of tiles stored for this store's source."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM tiles WHERE source=?", (self.source,)
+            ).fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            with self._db:
+                self._flush_touched()
+            self._db.close()
+
+    def import_directory(self, directory, cache_key=None):
+        """Copy mapview's loose `<key>_<z>_<x>_<y>.png` files into the store."""
+        batch = []
+        imported = 0
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return 0
+        for name in names:
+            m = _CACHE_FILE.match(name)
+            if m is None or (cache_key is not None and m.group("key") != cache_key):
+                continue
+            try:
+                with open(os.path.join(directory, name), "rb") as fh:
+                    data = fh.read()
+            except OSError:
+                continue
+            batch.append((int(m.group("z")), int(m.group("x")), int(m.group("y")), data))
+            if len(batch) >= 256:
+                self.put_many(batch)
+                imported += len(batch)
+                batch = []
+        if batch:
+            self.put_many(batch)
+            imported += len(batch)
+        return imported
+
+
+def tile_xy(lat, lon, zoom):
+    """Tile containing a point, as (x, row counted from the bottom)."""
+    n = 2 ** zoom
+    lat = min(max(lat, -85.0511287798), 85.0511287798)
+    x = int(floor((lon + 180.0) / 360.0 * n))
+    r = radians(lat)
+    y_top = int(floor((1.0 - log(tan(r) + 1.0 / cos(r)) / pi) / 2.0 * n))
+    x = min(max(x, 0), n - 1)
+    y_top = min(max(y_top, 0), n - 1)
+    return x, n - 1 - y_top
+
+
+def route_tiles(lats, lons, zooms, margin=1, limit=PREFETCH_MAX_TILES):
+    """Tiles covering a route's bounding box (plus `margin` tiles) per zoom.
+
+    Zooms are taken in the given order while they fit within `limit`
+    tiles; a zoom that does not fit is skipped, but later (smaller) ones
+    may still be taken. List the most important zooms first.
+    """
+    if not len(lats):
+        return []
+    south, north = min(lats), max(lats)
+    west, east = min(lons), max(lons)
+
+    tiles = []
+    for zoom in zooms:
+        n = 2 ** zoom
+        x0, y0 = tile_xy(south, west, zoom)
+        x1, y1 = tile_xy(north, east, zoom)
+        level = [
+            (zoom, x, y)
+            for x in range(max(x0 - margin, 0), min(x1 + margin, n - 1) + 1)
+            for y in range(max(y0 - margin, 0), min(y1 + margin, n - 1) + 1)
+        ]
+        if len(tiles) + len(level) > limit:
+            continue
+        tiles.extend(level)
+    return tiles
+
+
+def tile_url(template, zoom, x, y, subdomains="abc"):
+    """Fill a `{z}/{x}/{y}` URL template; `y` is counted from the bottom."""
+    return template.format(
+        z=zoom, x=x, y=2 ** zoom - 1 - y,
+        s=random.choice(subdomains) if subdomains else ""
+    )
+
+
+def fetch_tile(url, timeout=10):
+    request = urllib.request.Request(url, headers={"User-Agent": USER_AGENT})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return response.read()
+
+
+def prefetch(store, template, tiles, workers=PREFETCH_WORKERS, subdomains="abc", cancel=None):
+    """Download the `(zoom, x, y)` tiles missing from `store`.
+
+    Uses at most `workers` concurrent requests and stops early once the
+    `cancel` event is set. Returns `(fetched, failed)` counts; failures
+    (e.g. when offline) are skipped, the store keeps serving what it has.
+    """
+    missing = [t for t in tiles if not store.has(*t)]
+    if not missing:
+        return 0, 0
+
+    def download(tile):
+        if cancel is not None and cancel.is_set():
+            return None
+        zoom, x, y = tile
+        try:
+            return zoom, x, y, fetch_tile(tile_url(template, zoom, x, y, subdomains))
+        except (OSError, ValueError):
+            return None
+
+    fetched = failed = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for result in pool.map(download, missing):
+            if result is None:
+                failed += 1
+                continue
+            store.put(*result)
+            fetched += 1
+    return fetched, failed
@@ -0,0 +1,137 @@
+"""Time-indexed queries over a session's fixes.
+
+`TimeIndex` keeps a non-decreasing copy of a track's time column (fixes
+with an unknown time take the previous fix's time) next to prefix sums of
+distance and speed, so seeking to an instant, slicing a time window and
+summarizing it are binary searches plus a few lookups:
+
+    index = TimeIndex(session["coords"])
+    i = index.seek(t)                    # fix at or before t
+    start, stop = index.window(t0, t1)   # fixes with t0 <= time <= t1
+    stats = index.stats(t0, t1)          # distance, speeds... of the window
+
+Times are the track's seconds (see `Track.append_fix`). The index follows
+a track that grows, e.g. while following a live log, extending itself with
+the new fixes only.
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from itertools import accumulate, islice
+
+from analytics import segment_lengths
+
+
+class WindowStats(namedtuple(
+        "WindowStats", "t0 t1 start stop distance duration avg_speed max_speed")):
+    """Summary of the fixes `start:stop` timed within `[t0, t1]`.
+
+    `distance` is in metres along the fixes, `duration` the seconds from
+    the first to the last of them; speeds are in km/h, `avg_speed` being
+    the mean of the fixes' reported speeds.
+    """
+    __slots__ = ()
+
+
+class TimeIndex:
+    """Binary-search index over the time column of a `Track`."""
+
+    def __init__(self, track):
+        self.track = track
+        self.times = array("i")
+        # Prefix sums: metres up to fix i, and speeds of fixes before i
+        self.cum_distance = array("d")
+        self.cum_speed = array("d", [0.0])
+        self._extend()
+
+    def _extend(self):
+        """Index the fixes appended to the track since the last call."""
+        track = self.track
+        n = len(self.times)
+        if len(track) == n:
+            return
+        seconds = track.seconds
+        last = self.times[-1] if n else next((s for s in seconds if s >= 0), 0)
+        new = [max(s, last) for s in seconds[n:]]
+        self.times.extend(accumulate(new, max))
+
+        # Lengths from the last indexed fix on, so the sums carry over
+        if n == 0:
+            lengths = segment_lengths(track.lat, track.lon)
+            self.cum_distance.extend(accumulate(lengths, initial=0.0))
+        else:
+            lengths = segment_lengths(track.lat[n - 1:], track.lon[n - 1:])
+            self.cum_distance.extend(
+                islice(accumulate(lengths, initial=self.cum_distance[-1]), 1, None))
+        self.cum_speed.extend(
+            islice(accumulate(track.speed[n:], initial=self.cum_speed[-1]), 1, None))
+
+    def __len__(self):
+        self._extend()
+        return len(self.times)
+
+    @property
+    def start(self):
+        """Time of the first fix (0 without fixes)."""
+        self._extend()
+        return self.times[0] if self.times else 0
+
+    @property
+    def end(self):
+        """Time of the last fix (0 without fixes)."""
+        self._extend()
+        return self.times[-1] if self.times else 0
+
+    def seek(self, t):
+        """Index of the last fix at or before `t`; the first fix if none is."""
+        self._extend()
+        return max(bisect_right(self.times, t) - 1, 0)
+
+    def window(self, t0, t1):
+        """`(start, stop)` index range of the fixes with `t0 <= time <= t1`."""
+        self._extend()
+        start = bisect_left(self.times, t0)
+        return start, max(bisect_right(self.times, t1, start), start)
+
+    def slice(self, t0, t1):
+        """Zero-copy `Track` view of the fixes within `[t0, t1]`."""
+        start, stop = self.window(t0, t1)
+        return self.track.view(slice(start, stop))
+
+    def stats(self, t0, t1):
+        """`WindowStats` of the fixes within `[t0, t1]`.
+
+        Everything but `max_speed` comes from the prefix sums; the maximum
+        is taken over the window's slice of the speed column.
+        """
+        start, stop = self.window(t0, t1)
+        if stop - start < 1:
+            return WindowStats(t0, t1, start, stop, 0.0, 0, 0.0, 0.0)
+        times = self.times
+        speed = self.track.speed
+        return WindowStats(
+            t0, t1, start, stop,
+            self.cum_distance[stop - 1] - self.cum_distance[start],
+            times[stop - 1] - times[start],
+            (self.cum_speed[stop] - self.cum_speed[start]) / (stop - start),
+            float(max(speed[start:stop])),
+        )
+
+    def aggregates(self, interval, t0=None, t1=None):
+        """`WindowStats` for each `interval` seconds from `t0` to `t1`.
+
+        Defaults to the whole track. Each window is `[t, t + interval)`,
+        except that the last one includes `t1`.
+        """
+        if interval <= 0:
+            raise ValueError(f"interval must be positive, got {interval}")
+        t0 = self.start if t0 is None else t0
+        t1 = self.end if t1 is None else t1
+        result = []
+        t = t0
+        while t <= t1:
+            end = min(t + interval, t1 + 1)
+            result.append(self.stats(t, end - 1))
+            t += interval
+        return result
@@ -0,0 +1,132 @@
+"""Columnar storage for the GPS fixes of a session.
+
+A dict per fix costs hundreds of bytes; a `Track` keeps each field in its
+own packed typed array instead, so a fix takes 24 bytes:
+
+    lat, lon   float64  (array "d")
+    speed      float32  (array "f")
+    seconds    int32    (array "i"), -1 when unknown
+
+Fixes only carry the time of day. `append_fix` turns it into seconds since
+midnight (UTC) of the session's first day, so the column keeps growing
+across midnight and can be searched by time (see `timeline`).
+"""
+
+from array import array
+from collections import namedtuple
+
+DAY = 86400
+HALF_DAY = DAY // 2
+
+
+def parse_hms(text):
+    """Convert `HH:MM:SS` to seconds of day, or -1 if malformed."""
+    try:
+        h, m, s = text.split(":")
+        return int(h) * 3600 + int(m) * 60 + int(s)
+    except ValueError:
+        return -1
+
+
+def format_hms(seconds):
+    """Convert seconds (of day, or since the first day's midnight) to `HH:MM:SS`."""
+    if seconds < 0:
+        return "?"
+    m, s = divmod(int(seconds) % DAY, 60)
+    h, m = divmod(m, 60)
+    return f"{h:02d}:{m:02d}:{s:02d}"
+
+
+class Fix(namedtuple("Fix", "lat lon speed seconds")):
+    """A single GPS fix read out of a `Track`."""
+    __slots__ = ()
+
+    @property
+    def timestamp(self):
+        return format_hms(self.seconds)
+
+
+class Track:
+    """Packed lat/lon/speed/time columns for one session.
+
+    Indexing with an int returns a `Fix`; slicing returns a zero-copy view
+    over the same buffers. Views are read-only, and while one is alive the
+    owning track cannot grow (the arrays refuse to resize while exported),
+    so keep them short-lived.
+    """
+    __slots__ = ("lat", "lon", "speed", "seconds")
+
+    def __init__(self, lat=None, lon=None, speed=None, seconds=None):
+        self.lat = array("d") if lat is None else lat
+        self.lon = array("d") if lon is None else lon
+        self.speed = array("f") if speed is None else speed
+        self.seconds = array("i") if seconds is None else seconds
+
+    def append(self, lat, lon, speed, seconds):
+        self.lat.append(lat)
+        self.lon.append(lon)
+        self.speed.append(speed)
+        self.seconds.append(seconds)
+
+    def append_fix(self, lat, lon, speed, time_of_day):
+        """Append a fix timed by its time of day, unrolling midnight.
+
+        The time is placed on the day that keeps it within half a day of
+        the last known time, so a session running past midnight keeps
+        counting up while small steps back (out-of-order fixes) stay small.
+        """
+        seconds = self.seconds
+        if time_of_day >= 0 and seconds:
+            last = seconds[-1]
+            if last < 0:
+                last = next((s for s in reversed(seconds) if s >= 0), -1)
+            if last >= DAY or time_of_day < last - HALF_DAY:
+                time_of_day += last - last % DAY
+                if time_of_day < last - HALF_DAY:
+                    time_of_day += DAY
+                elif time_of_day > last + HALF_DAY:
+                    time_of_day -= DAY
+        self.lat.append(lat)
+        self.lon.append(lon)
+        self.speed.append(speed)
+        seconds.append(time_of_day)
+
+    def pop(self):
+        """Remove and return the last fix."""
+        return Fix(self.lat.pop(), self.lon.pop(), self.speed.pop(), self.seconds.pop())
+
+    def extend(self, other):
+        self.lat.extend(other.lat)
+        self.lon.extend(other.lon)
+        self.speed.extend(other.speed)
+        self.seconds.extend(other.seconds)
+
+    def __len__(self):
+        return len(self.lat)
+
+    def __iter__(self):
+        return map(Fix, self.lat, self.lon, self.speed, self.seconds)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.view(index)
+        return Fix(self.lat[index], self.lon[index],
+                   self.speed[index], self.seconds[index])
+
+    def view(self, index=slice(None)):
+        """Return a `Track` of memoryviews over `index` without copying."""
+        return Track(
+            memoryview(self.lat).toreadonly()[index],
+            memoryview(self.lon).toreadonly()[index],
+            memoryview(self.speed).toreadonly()[index],
+            memoryview(self.seconds).toreadonly()[index]
+        )
+
+    def copy(self):
+        """Return an independent, growable copy of this track."""
+        return Track(array("d", self.lat), array("d", self.lon),
+                     array("f", self.speed), array("i", self.seconds))
+
+    @property
+    def nbytes(self):
+        return len(self) * (8 + 8 + 4 + 4)
@@ -0,0 +1,610 @@
+"""The Kivy app: drop screen, session list and the lazily built map screen.
+
+Started by `main`, which keeps the main module free of Kivy imports.
+"""
+
+import time
+# Start of the launch, for the startup report; Kivy's imports dominate it
+_LAUNCH = time.perf_counter()
+
+import math
+import os
+from functools import partial
+from kivy.app import App
+from kivy.uix.screenmanager import ScreenManager, Screen, FadeTransition
+from kivy.uix.boxlayout import BoxLayout
+from kivy.uix.button import Button
+from kivy.uix.label import Label
+from kivy.uix.checkbox import CheckBox
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
+from kivy.uix.recycleboxlayout import RecycleBoxLayout
+from kivy.properties import NumericProperty
+from kivy.graphics import Color, Line, Rectangle, RoundedRectangle
+from kivy.core.window import Window
+from kivy.clock import Clock
+from kivy.utils import get_color_from_hex
+
+# The map screen (and with it mapview and the tile store) is imported the
+# first time a session is opened; see LazyScreenManager
+from analytics import describe, session_stats
+from importer import BatchImport, LogImport
+from logcache import LogCache
+from logparser import load_coords
+from perf import PERF
+from tail import LogTail
+
+_IMPORTED = time.perf_counter()
+
+
+DROP_HINT = "Drop your log files or a folder here\n\n(.txt files only)"
+
+# F12 toggles the performance overlay on the map, F10 exports the numbers
+KEY_F10 = 291
+KEY_F12 = 293
+
+# Seconds between polls of a followed log
+FOLLOW_INTERVAL = 1.0
+
+
+def _on_main_thread(callback, *args):
+    """Import callbacks run on the Kivy main thread."""
+    Clock.schedule_once(lambda dt: callback(*args))
+
+
+class LiveFollow:
+    """Follows a log that the device is still writing.
+
+    Every FOLLOW_INTERVAL seconds the `LogTail` reads what was appended;
+    sessions that started are added to `manager.sessions` and the map is
+    told about the new fixes (see `MapScreen.live_update`).
+    """
+
+    def __init__(self, manager, tail, interval=FOLLOW_INTERVAL):
+        self.manager = manager
+        self.tail = tail
+        self.interval = interval
+        self._event = None
+
+    def start(self):
+        if self._event is None:
+            self._event = Clock.schedule_interval(self._poll, self.interval)
+
+    def stop(self):
+        if self._event is not None:
+            self._event.cancel()
+            self._event = None
+
+    def _poll(self, dt):
+        previous = self.tail.last
+        with PERF.timer("follow.poll"):
+            started = self.tail.poll()
+
+        sessions = self.manager.sessions
+        session_list = self.manager.built_screen("session_list")
+        sessions.extend(started)
+        if started and session_list is not None:
+            session_list.append_session()
+
+        current = self.tail.current
+        map_screen = self.manager.built_screen("map")
+        if current is not None and map_screen is not None:
+            map_screen.live_update(current, previous)
+
+
+class DragDropScreen(Screen):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        
+        # Main layout with gradient background
+        layout = BoxLayout(orientation='vertical', padding=40, spacing=20)
+        
+        with layout.canvas.before:
+            Color(*get_color_from_hex('#1a1a2e'))
+            self.bg_rect = Rectangle(pos=layout.pos, size=layout.size)
+        
+        layout.bind(pos=self._update_bg, size=self._update_bg)
+        
+        # Title
+        title = Label(
+            text="[b]Running Companion[/b]",
+            markup=True,
+            font_size='32sp',
+            size_hint_y=None,
+            height=80,
+            color=get_color_from_hex('#ffffff')
+        )
+        
+        # Drop zone
+        drop_zone = BoxLayout(orientation='vertical', padding=60, spacing=20)
+        with drop_zone.canvas.before:
+            Color(*get_color_from_hex('#16213e'))
+            self.drop_bg = RoundedRectangle(
+                pos=drop_zone.pos, 
+                size=drop_zone.size,
+                radius=[20]
+            )
+        
+        drop_zone.bind(pos=self._update_drop_bg, size=self._update_drop_bg)
+        
+        # Wave logo container
+        wave_container = BoxLayout(size_hint_y=None, height=100)
+        with wave_container.canvas:
+            # Draw wave pattern
+            Color(*get_color_from_hex('#53d9ff'))
+            self.wave = Line(points=[], width=3, cap='round', joint='round')
+        
+        wave_container.bind(pos=self._update_wave, size=self._update_wave)
+        Clock.schedule_once(lambda dt: self._update_wave(wave_container, None), 0.1)
+        
+        self.label = Label(
+            text=DROP_HINT,
+            markup=True,
+            halign="center",
+            valign="middle",
+            font_size='20sp',
+            color=get_color_from_hex('#e94560')
+        )
+        
+        # Import options and cancel button
+        controls = BoxLayout(size_hint_y=None, height=40, spacing=10)
+        
+        self.open_early = CheckBox(size_hint_x=None, width=40, active=False)
+        open_early_label = Label(
+            text="Open list after first session",
+            halign="left",
+            valign="middle",
+            font_size='14sp',
+            color=(1, 1, 1, 0.7)
+        )
+        open_early_label.bind(size=open_early_label.setter('text_size'))
+        
+        self.follow = CheckBox(size_hint_x=None, width=40, active=False)
+        follow_label = Label(
+            text="Follow file while it grows",
+            halign="left",
+            valign="middle",
+            font_size='14sp',
+            color=(1, 1, 1, 0.7)
+        )
+        follow_label.bind(size=follow_label.setter('text_size'))
+        
+        self.cancel_btn = Button(
+            text="Cancel",
+            size_hint_x=None,
+            width=120,
+            background_normal='',
+            background_color=get_color_from_hex('#e94560'),
+            color=get_color_from_hex('#ffffff'),
+            bold=True,
+            opacity=0,
+            disabled=True
+        )
+        self.cancel_btn.bind(on_press=lambda b: self.cancel_import())
+        
+        controls.add_widget(self.open_early)
+        controls.add_widget(open_early_label)
+        controls.add_widget(self.follow)
+        controls.add_widget(follow_label)
+        controls.add_widget(self.cancel_btn)
+        
+        drop_zone.add_widget(wave_container)
+        drop_zone.add_widget(self.label)
+        drop_zone.add_widget(controls)
+        
+        self.log_import = None
+        self.log_cache = LogCache()
+        self.live = None
+        # Several files dropped at once arrive as one event each
+        self._dropped = []
+        self._drop_trigger = Clock.create_trigger(self._import_dropped, 0.1)
+        
+        layout.add_widget(title)
+        layout.add_widget(drop_zone)
+        
+        self.add_widget(layout)
+        Window.bind(on_drop_file=self._on_file_drop)
+
+    def _update_bg(self, instance, value):
+        self.bg_rect.pos = instance.pos
+        self.bg_rect.size = instance.size
+    
+    def _update_drop_bg(self, instance, value):
+        self.drop_bg.pos = instance.pos
+        self.drop_bg.size = instance.size
+    
+    def _update_wave(self, instance, value):
+        """Draw a Morlet wavelet pattern."""
+        # Wait until widget is properly sized
+        if instance.width == 0 or instance.height == 0:
+            return
+            
+        points = []
+        center_x = instance.x + instance.width / 2
+        center_y = instance.y + instance.height / 2
+        width = min(instance.width * 0.6, 300)
+        
+        # Morlet wavelet parameters
+        omega = 5.0  # Angular frequency
+        sigma = 1.0  # Scaling factor
+        amplitude = 25
+        
+        for i in range(150):
+            t = (i - 75) / 15.0  # Center around 0, range from -5 to 5
+            x = center_x - width/2 + (i * width / 150)
+            
+            # Morlet wavelet: cos(omega*t) * exp(-t^2 / (2*sigma^2))
+            gaussian = math.exp(-(t**2) / (2 * sigma**2))
+            wave = math.cos(omega * t) * gaussian
+            y = center_y + amplitude * wave
+            
+            points.extend([x, y])
+        
+        self.wave.points = points
+
+    def _on_file_drop(self, window, file_path_bytes, x, y):
+        try:
+            path = file_path_bytes.decode("utf-8")
+        except:
+            path = os.fsdecode(file_path_bytes)
+        self._dropped.append(path)
+        self._drop_trigger()
+
+    def _import_dropped(self, dt):
+        paths, self._dropped = self._dropped, []
+        paths = [p for p in paths if os.path.isdir(p) or p.lower().endswith(".txt")]
+        if not paths:
+            self.label.text = "[b]Please drop .txt files or a folder[/b]"
+            return
+
+        if len(paths) == 1 and not os.path.isdir(paths[0]):
+            # A log still being written would never match its cache entry
+            follow = self.follow.active
+            cache = None if follow else self.log_cache
+            log_import = LogImport(paths[0], cache=cache, lazy=True,
+                                   dispatch=_on_main_thread)
+            # Decided at drop time: the box may change before the import ends
+            log_import.follow = follow
+            self._start_import(log_import)
+        else:
+            self._start_import(BatchImport(paths, cache=self.log_cache,
+                                           dispatch=_on_main_thread))
+
+    def _start_import(self, log_import):
+        self.cancel_import()
+        if self.live is not None:
+            self.live.stop()
+            self.live = None
+        self.manager.sessions = []
+        self.label.text = "[b]Reading log...[/b]"
+        self.cancel_btn.opacity = 1
+        self.cancel_btn.disabled = False
+
+        log_import.on_progress = partial(self._on_import_progress, log_import)
+        log_import.on_session = partial(self._on_import_session, log_import)
+        log_import.on_done = partial(self._on_import_done, log_import)
+        log_import.on_stats = partial(self._on_import_stats, log_import)
+        self.log_import = log_import
+        log_import.start()
+
+    def cancel_import(self):
+        if self.log_import is not None:
+            self.log_import.cancel()
+
+    def _on_import_progress(self, log_import, bytes_read, total_bytes, session_count):
+        # Ignore late callbacks from a cancelled or superseded import
+        if log_import is not self.log_import or log_import.cancelled:
+            return
+        mb_read = bytes_read / 1e6
+        mb_total = max(total_bytes, 1) / 1e6
+        if isinstance(log_import, BatchImport):
+            found = f"{log_import.files_done} / {len(log_import.files)} files"
+        else:
+            found = f"{session_count} sessions found"
+        self.label.text = (
+            f"[b]Reading log...[/b]\n\n"
+            f"{mb_read:.1f} / {mb_total:.1f} MB\n"
+            f"{found}"
+        )
+
+    def _on_import_session(self, log_import, session):
+        if log_import is not self.log_import or log_import.cancelled:
+            return
+        sessions = self.manager.sessions
+        sessions.append(session)
+        
+        if self.manager.current == "session_list":
+            self.manager.get_screen("session_list").append_session()
+        elif len(sessions) == 1 and self.open_early.active:
+            self.manager.current = "session_list"
+
+    def _on_import_stats(self, log_import, sessions):
+        if log_import is not self.log_import or log_import.cancelled:
+            return
+        session_list = self.manager.built_screen("session_list")
+        if session_list is not None:
+            session_list.refresh()
+
+    def _on_import_done(self, log_import, sessions, cancelled):
+        if log_import is not self.log_import:
+            return
+        
+        # Keep the reference: a lazy import may still be warming the cache
+        # and a new drop has to cancel it.
+        self.cancel_btn.opacity = 0
+        self.cancel_btn.disabled = True
+        
+        if cancelled:
+            self.label.text = f"[b]Import cancelled[/b]\n\n{DROP_HINT}"
+            return
+        
+        if getattr(log_import, "follow", False):
+            self._follow(log_import)
+
+        if self.manager.sessions:
+            self.label.text = DROP_HINT
+            self.manager.current = "session_list"
+        elif self.live is not None:
+            self.label.text = "[b]Following log...[/b]\n\nWaiting for the first fix"
+        else:
+            self.label.text = "[b]Could not parse file[/b]\n\nPlease check the format"
+
+    def _follow(self, log_import):
+        """Keep reading the imported log from where the index stopped."""
+        sessions = self.manager.sessions
+        if sessions:
+            last = sessions[-1]
+            load_coords(last)
+            tail = LogTail(log_import.path, last["source"][2], last)
+        else:
+            tail = LogTail(log_import.path)
+        self.live = LiveFollow(self.manager, tail)
+        self.live.start()
+
+
+class SessionRow(RecycleDataViewBehavior, Button):
+    """One row of the session list; RecycleView reuses rows while scrolling."""
+    
+    index = NumericProperty(0)
+    
+    def __init__(self, **kwargs):
+        super().__init__(
+            markup=True,
+            background_normal='',
+            background_color=get_color_from_hex('#0f3460'),
+            color=get_color_from_hex('#ffffff'),
+            font_size='13sp',
+            halign='center',
+            valign='middle',
+            padding=[10, 10],
+            **kwargs
+        )
+        self.bind(size=self.setter('text_size'))
+
+    def refresh_view_attrs(self, rv, index, data):
+        self.index = index
+        return super().refresh_view_attrs(rv, index, data)
+
+    def on_press(self):
+        App.get_running_app().root.get_screen("session_list").open_session(self.index)
+
+
+def session_row(i, s):
+    """RecycleView data for session `i`."""
+    stats = s.get("stats")
+    detail = describe(stats) if stats is not None else s.get('summary_text', '')
+    return {
+        "text": f"[b]Session {i+1}[/b]\n{s.get('date') or '?'} at {s.get('time') or '?'}\n{detail}"
+    }
+
+
+class SessionListScreen(Screen):
+    """Scrollable list of the loaded sessions.
+
+    The widgets are built once. The row data is kept between visits and
+    only extended when sessions were added, or rebuilt when a new log
+    replaced `manager.sessions`.
+    """
+    
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        
+        layout = BoxLayout(orientation="vertical", padding=20, spacing=15)
+        
+        with layout.canvas.before:
+            Color(*get_color_from_hex('#1a1a2e'))
+            self.bg = Rectangle(pos=layout.pos, size=layout.size)
+        
+        layout.bind(pos=self._update_bg, size=self._update_bg)
+        
+        # Header
+        header = Label(
+            text="[b]Your Sessions[/b]",
+            markup=True,
+            size_hint_y=None,
+            height=60,
+            font_size='28sp',
+            color=get_color_from_hex('#ffffff')
+        )
+        layout.add_widget(header)
+
+        # Problems opening a session, e.g. its log went away
+        self.status = Label(
+            text="",
+            size_hint_y=None,
+            height=30,
+            font_size='14sp',
+            color=get_color_from_hex('#e94560')
+        )
+        layout.add_widget(self.status)
+
+        self.placeholder = Label(text="No sessions loaded", color=(1, 1, 1, 0.7))
+        
+        self.rv = RecycleView(bar_width=6, scroll_type=['bars', 'content'])
+        self.rv.viewclass = SessionRow
+        rows = RecycleBoxLayout(
+            orientation='vertical',
+            default_size=(None, 80),
+            default_size_hint=(1, None),
+            size_hint_y=None,
+            spacing=10,
+            padding=[5, 5]
+        )
+        rows.bind(minimum_height=rows.setter('height'))
+        self.rv.add_widget(rows)
+        
+        self.body = BoxLayout()
+        self.body.add_widget(self.placeholder)
+        layout.add_widget(self.body)
+
+        # Back button
+        back_btn = Button(
+            text="Back",
+            size_hint_y=None,
+            height=50,
+            background_normal='',
+            background_color=get_color_from_hex('#e94560'),
+            color=get_color_from_hex('#ffffff'),
+            font_size='16sp',
+            bold=True
+        )
+        back_btn.bind(on_press=lambda b: setattr(self.manager, "current", "dragdrop"))
+        layout.add_widget(back_btn)
+        
+        self.add_widget(layout)
+        self._sessions = None
+
+    def on_pre_enter(self):
+        self.status.text = ""
+        self.sync()
+
+    def sync(self):
+        """Bring the row data in line with `manager.sessions`."""
+        sessions = getattr(self.manager, "sessions", None)
+        if sessions is None:
+            sessions = []
+        if sessions is not self._sessions:
+            self._sessions = sessions
+            self.rv.data = [session_row(i, s) for i, s in enumerate(sessions)]
+        elif len(self.rv.data) < len(sessions):
+            start = len(self.rv.data)
+            self.rv.data.extend(session_row(i, s) for i, s in enumerate(sessions[start:], start))
+        self._show_rows(bool(sessions))
+
+    def refresh(self):
+        """Redraw every row, e.g. once the stats of the sessions are known."""
+        if self._sessions is not None:
+            self.rv.data = [session_row(i, s) for i, s in enumerate(self._sessions)]
+
+    def _show_rows(self, show):
+        child = self.rv if show else self.placeholder
+        if child.parent is None:
+            self.body.clear_widgets()
+            self.body.add_widget(child)
+
+    def append_session(self):
+        """Add a session that finished parsing while the list is shown."""
+        self.sync()
+
+    def _update_bg(self, instance, value):
+        self.bg.pos = instance.pos
+        self.bg.size = instance.size
+
+    def open_session(self, idx):
+        session = self.manager.sessions[idx]
+        try:
+            load_coords(session)
+        except OSError as e:
+            # An indexed session is read from its log, which may be gone
+            print(f"Error loading session: {e}")
+            self.status.text = "This session's log is no longer available"
+            return
+        if session.get("stats") is None and session_stats(session) is not None:
+            if idx < len(self.rv.data):
+                self.rv.data[idx] = session_row(idx, session)
+        self.manager.selected_session = session
+        self.manager.current = "map"
+
+
+def _map_screen(**kwargs):
+    with PERF.timer("startup.mapview"):
+        from mapscreen import MapScreen
+    return MapScreen(**kwargs)
+
+
+class LazyScreenManager(ScreenManager):
+    """ScreenManager that creates screens the first time they are shown.
+
+    `factories` maps screen names to callables taking the screen's
+    keyword arguments. `get_screen` (and so setting `current`) creates a
+    missing screen; `built_screen` only returns screens that exist.
+    """
+
+    def __init__(self, factories=None, **kwargs):
+        super().__init__(**kwargs)
+        self.factories = dict(factories or {})
+
+    def built_screen(self, name):
+        for screen in self.screens:
+            if screen.name == name:
+                return screen
+        return None
+
+    def get_screen(self, name):
+        if self.built_screen(name) is None and name in self.factories:
+            with PERF.timer(f"screen.{name}"):
+                self.add_widget(self.factories.pop(name)(name=name))
+        return super().get_screen(name)
+
+
+class LogMapApp(App):
+    def build(self):
+        with PERF.timer("startup.build"):
+            Window.clearcolor = get_color_from_hex('#1a1a2e')
+            
+            sm = LazyScreenManager(
+                factories={"session_list": SessionListScreen, "map": _map_screen},
+                transition=FadeTransition()
+            )
+            sm.sessions = []
+            sm.selected_session = None
+
+            sm.add_widget(DragDropScreen(name="dragdrop"))
+            
+            Window.bind(on_key_down=self._on_key_down)
+        return sm
+
+    def on_start(self):
+        PERF.record("startup.import", _IMPORTED - _LAUNCH)
+        Window.bind(on_flip=self._on_first_frame)
+
+    def _on_first_frame(self, window):
+        """Report how long the launch took, once the first frame is shown."""
+        window.unbind(on_flip=self._on_first_frame)
+        first_frame = time.perf_counter() - _LAUNCH
+        PERF.record("startup.first_frame", first_frame)
+        build = PERF.get("startup.build")
+        print(f"Startup: imports {(_IMPORTED - _LAUNCH) * 1e3:.0f} ms, "
+              f"build {build.last * 1e3:.0f} ms, first frame after {first_frame * 1e3:.0f} ms")
+
+    def _on_key_down(self, window, key, scancode, codepoint, modifiers):
+        if key == KEY_F12:
+            # Only a map that was opened has anything to show
+            map_screen = self.root.built_screen("map")
+            if map_screen is not None:
+                map_screen.toggle_perf_overlay()
+            return True
+        if key == KEY_F10:
+            path = os.path.join(
+                os.path.dirname(os.path.abspath(__file__)),
+                time.strftime("perf-%Y%m%d-%H%M%S.json")
+            )
+            PERF.export(path)
+            print(f"Performance data written to {path}")
+            return True
+        return False
+
+    def on_stop(self):
+        path = os.environ.get("RUNNING_COMPANION_PERF")
+        if path:
+            PERF.export(path)